@@ -1,14 +1,29 @@
 # app.py — Ride-Sharing Intelligence (stable connection, no runtime installs)
+import os
 import sys
-import random
+import time
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import streamlit as st
+from streamlit import runtime
 import pandas as pd
 import plotly.express as px
 
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError, OperationFailure
+import archive
+import datagen
+import telemetry
+import profiling
+from ride_repository import (
+    ARCHIVE_DIR, EMPTY_METRICS, MAP_CELL_DEGREES, PAGE_COLUMNS, RESET_MODES, RIDES_PAGE_SIZE, RIDES_SORT, ROLLUP_UNITS, TREND_MODELS,
+    RIDE_TRANSITIONS, IdAllocator, MongoMonitor, RideRepository, advance_ride, archive_enabled, connect, create_ride, export_archive, keyset_query,
+    load_rides_snapshot, map_points, page_db, pool_settings, redacted_uri, reseed, revenue_since, rides_frame, sync_ride_counter, ts,
+)
+
+from pymongo.errors import ServerSelectionTimeoutError, OperationFailure, PyMongoError
 
 # ---------- Page and styles ----------
 st.set_page_config(page_title="Ride-Sharing Intelligence", page_icon="🚗", layout="wide", initial_sidebar_state="expanded")  # [web:29]
@@ -24,170 +39,673 @@ st.markdown("""
 """, unsafe_allow_html=True)  # [web:29]
 
 # ---------- Mongo connection (cached, retryable) ----------
-def mongo_uri():
-    return "mongodb://localhost:27017"  # adjust if needed [web:32]
+# Settings and read routing live in ride_repository.py (MONGO_CONFIG); this maps sidebar labels to its page keys.
+PAGE_KEYS = {"📊 Dashboard": "dashboard", "🚕 Real-Time Rides": "realtime", "👨‍✈️ Driver Management": "drivers",
+             "📈 Surge Pricing": "surge", "📉 Analytics": "analytics", "➕ Add New Ride": "add_ride"}
+PAGE_LABELS = {key: label for label, key in PAGE_KEYS.items()}
+
+@st.cache_resource(show_spinner=False)
+def get_monitor():
+    return MongoMonitor()  # shared by every client this process creates, across reconnects
+
+# One client per connection generation, shared by every session. Reconnect bumps the generation
+# for the whole process and releases the previous generation's client and background workers,
+# so a reconnect never leaves a snapshot loader or change stream running on a stale client.
+@st.cache_resource(show_spinner=False)
+def connection_state():
+    return {"nonce": 0, "lock": threading.Lock(), "release": []}  # release: callbacks for this generation's resources
+
+def owned(resource, release):
+    # Registers a per-generation resource for force_reconnect to release (cache_resource has no
+    # release hook before Streamlit 1.53).
+    state = connection_state()
+    with state["lock"]:
+        state["release"].append(release)
+    return resource
 
-@st.cache_resource(show_spinner="Connecting to MongoDB...", ttl=0)
-def get_db(_nonce: int = 0):
-    client = MongoClient(mongo_uri(), serverSelectionTimeoutMS=3000)  # 3s timeout [web:94]
-    client.admin.command("ping")
-    return client["ride_demo"]  # stable app DB name [web:32]
+@st.cache_resource(show_spinner="Connecting to MongoDB...")
+def get_db(nonce: int = 0):
+    db = connect(event_listeners=[get_monitor(), profiling.CommandTap()])  # 3s timeout [web:94]
+    return owned(db, db.client.close)
+
+HEALTH_CHECK_SECONDS = int(os.environ.get("RIDE_HEALTH_CHECK_SECONDS", 15))
+
+@st.cache_data(ttl=HEALTH_CHECK_SECONDS, show_spinner=False)
+def mongo_health(_db, nonce: int = 0):
+    # At most one ping per HEALTH_CHECK_SECONDS per connection instead of one per rerun.
+    try:
+        started = time.perf_counter()
+        _db.command('ping')
+        return True, (time.perf_counter() - started) * 1000
+    except PyMongoError:
+        return False, None
 
 def force_reconnect():
-    st.session_state["_mongo_nonce"] = st.session_state.get("_mongo_nonce", 0) + 1
+    state = connection_state()
+    with state["lock"]:
+        state["nonce"] += 1
+        release, state["release"] = state["release"], []
+    # Every cached entry belongs to an old generation now; workers stop before their client closes.
+    for fn in (get_snapshots, get_ride_watcher, get_ride_id_allocator, get_db):
+        fn.clear()
+    for stop in reversed(release):
+        stop()
     st.rerun()  # re-exec script and bust cache via nonce [web:89]
 
-# ---------- Seeding ----------
-def initialize_database(db):
-    try:
-        for col in ['drivers', 'riders', 'rides', 'surge_pricing', 'vehicles']:
-            db[col].delete_many({})
-        # Drivers
-        driver_names = ['John Smith','Emma Johnson','Michael Brown','Sarah Davis','David Wilson','Lisa Anderson','James Taylor','Maria Garcia','Robert Martinez','Jennifer Lopez','William Clark','Patricia White']
-        drivers = []
-        for i, name in enumerate(driver_names, 1):
-            drivers.append({
-                "driver_id": f"DRV{str(i).zfill(3)}",
-                "name": name,
-                "phone": f"+1-555-{random.randint(1000, 9999)}",
-                "rating": round(random.uniform(4.0, 5.0), 2),
-                "total_rides": random.randint(50, 500),
-                "status": random.choice(['available', 'busy', 'offline']),
-                "location": {"lat": round(random.uniform(40.7, 40.8), 4), "lng": round(random.uniform(-74.0, -73.9), 4)},
-                "earnings_today": round(random.uniform(50, 300), 2),
-                "vehicle_id": f"VEH{str(i).zfill(3)}"
-            })
-        db.drivers.insert_many(drivers)
-
-        # Riders
-        rider_names = ['Alice Cooper','Bob Martin','Charlie Evans','Diana Prince','Edward Norton','Fiona Apple','George Lucas','Hannah Montana','Ian McKellen','Julia Roberts','Kevin Hart','Laura Palmer']
-        riders = []
-        for i, name in enumerate(rider_names, 1):
-            riders.append({
-                "rider_id": f"RDR{str(i).zfill(3)}",
-                "name": name,
-                "phone": f"+1-555-{random.randint(1000, 9999)}",
-                "rating": round(random.uniform(4.0, 5.0), 2),
-                "total_rides": random.randint(10, 200),
-                "payment_method": random.choice(['Credit Card','PayPal','Apple Pay','Google Pay']),
-                "wallet_balance": round(random.uniform(0, 100), 2)
-            })
-        db.riders.insert_many(riders)
-
-        # Vehicles
-        vehicle_data = [('Toyota','Camry',2021),('Honda','Civic',2022),('Ford','Fusion',2020),('Chevrolet','Malibu',2021),('Nissan','Altima',2022),('Hyundai','Sonata',2021),('Kia','Optima',2020),('Mazda','Mazda6',2021),('Volkswagen','Passat',2022),('Subaru','Legacy',2021),('Tesla','Model 3',2023),('BMW','3 Series',2022)]
-        colors = ['Black','White','Silver','Blue','Red','Gray','Green','Brown']
-        vehicles = []
-        for i, (make, model, year) in enumerate(vehicle_data, 1):
-            vehicles.append({
-                "vehicle_id": f"VEH{str(i).zfill(3)}",
-                "make": make, "model": model, "year": year,
-                "license_plate": f"{chr(65+random.randint(0,25))}{chr(65+random.randint(0,25))}{random.randint(1000,9999)}",
-                "color": random.choice(colors),
-                "capacity": random.choice([4,6,8])
-            })
-        db.vehicles.insert_many(vehicles)
-
-        # Rides
-        rides, statuses, street_names = [], ['completed','in_progress','cancelled','pending'], ['Main','Oak','Pine','Maple','Broadway','Park','Market','First','Second','Third']
-        for i in range(15):
-            start_time = datetime.now() - timedelta(hours=random.randint(0, 72))
-            duration = random.randint(10, 60)
-            distance = round(random.uniform(2, 25), 2)
-            base_fare = round(distance * 1.5 + random.uniform(2, 5), 2)
-            surge_multiplier = round(random.uniform(1.0, 2.5), 1)
-            status = random.choice(statuses)
-            rides.append({
-                "ride_id": f"RIDE{str(i + 1).zfill(4)}",
-                "driver_id": f"DRV{str(random.randint(1, 12)).zfill(3)}",
-                "rider_id": f"RDR{str(random.randint(1, 12)).zfill(3)}",
-                "pickup_location": {"address": f"{random.randint(100, 999)} {random.choice(street_names)} St","lat": round(random.uniform(40.7, 40.8), 4),"lng": round(random.uniform(-74.0, -73.9), 4)},
-                "dropoff_location": {"address": f"{random.randint(100, 999)} {random.choice(street_names)} Ave","lat": round(random.uniform(40.7, 40.8), 4),"lng": round(random.uniform(-74.0, -73.9), 4)},
-                "request_time": start_time.isoformat(),
-                "start_time": (start_time + timedelta(minutes=random.randint(2, 8))).isoformat(),
-                "end_time": (start_time + timedelta(minutes=duration)).isoformat(),
-                "status": status,
-                "distance_km": distance,
-                "duration_minutes": duration,
-                "base_fare": base_fare,
-                "surge_multiplier": surge_multiplier,
-                "total_fare": round(base_fare * surge_multiplier, 2),
-                "payment_status": 'paid' if status == 'completed' else 'pending',
-                "rating": round(random.uniform(3.5, 5.0), 1) if status == 'completed' else None
-            })
-        db.rides.insert_many(rides)
-
-        # Surge data
-        zone_types = ['Downtown','Uptown','Midtown','Airport','Business District','Suburb','Mall Area','Train Station','University','Beach Area']
-        surge_data = []
-        for i in range(12):
-            surge_data.append({
-                "zone_id": f"ZONE{str(i + 1).zfill(2)}",
-                "zone_name": f"{random.choice(zone_types)} {random.choice(['North','South','East','West','Central'])}",
-                "current_surge": round(random.uniform(1.0, 2.8), 1),
-                "demand_level": random.choice(['low','medium','high','very_high']),
-                "available_drivers": random.randint(2, 25),
-                "active_requests": random.randint(0, 40),
-                "timestamp": datetime.now().isoformat(),
-                "avg_wait_time": random.randint(2, 15)
-            })
-        db.surge_pricing.insert_many(surge_data)
-        return True
-    except Exception as e:
-        st.error(f"Database Initialization Error: {e}")  # UI side effect
-        return False  # [web:32]
-
-# ---------- Data access ----------
-def get_dashboard_metrics(db):
-    try:
-        total_rides = db.rides.count_documents({})
-        active_drivers = db.drivers.count_documents({"status": "available"})
-        completed_rides = list(db.rides.find({"status": "completed"}))
-        total_revenue = sum([ride.get('total_fare', 0) for ride in completed_rides])
-        rides_with_rating = list(db.rides.find({"rating": {"$ne": None}}))
-        avg_rating = round(sum([r['rating'] for r in rides_with_rating]) / len(rides_with_rating), 2) if rides_with_rating else 0
-        return {"total_rides": total_rides,"active_drivers": active_drivers,"total_revenue": total_revenue,"avg_rating": avg_rating}
-    except Exception as e:
-        st.error(f"Error fetching metrics: {e}")
-        return {"total_rides": 0, "active_drivers": 0, "total_revenue": 0, "avg_rating": 0}  # [web:32]
-
-def get_all_rides(db):
-    try:
-        rides = list(db.rides.find({}, {'_id': 0}))
-        if rides:
-            df = pd.DataFrame(rides)
-            if 'request_time' in df.columns:
-                df['request_time'] = pd.to_datetime(df['request_time'])
-            return df.sort_values('request_time', ascending=False) if not df.empty else df
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Error fetching rides: {e}")
-        return pd.DataFrame()  # [web:32]
-
-def get_all_drivers(db):
-    try:
-        drivers = list(db.drivers.find({}, {'_id': 0}))
-        return pd.DataFrame(drivers)
-    except Exception as e:
-        st.error(f"Error fetching drivers: {e}")
-        return pd.DataFrame()  # [web:32]
+# ---------- Metrics (Prometheus exporter, opt-in: RIDE_METRICS_PORT) ----------
+# Families live in telemetry.REGISTRY, which outlives reruns; declaring them here again is a lookup.
+METRICS_PORT = os.environ.get("RIDE_METRICS_PORT")
+METRICS_ADDR = os.environ.get("RIDE_METRICS_ADDR", "127.0.0.1")
+LOADER_SECONDS = telemetry.REGISTRY.histogram("ride_loader_seconds", "Latency of page reads that missed the session cache, and of snapshot loads", ["loader"])
+LOADER_ERRORS = telemetry.REGISTRY.counter("ride_loader_errors_total", "Page reads that failed and fell back", ["loader"])
+CACHE_LOOKUPS = telemetry.REGISTRY.counter("ride_cache_lookups_total", "Session data cache lookups", ["collection", "result"])
+CACHE_HIT_RATIO = telemetry.REGISTRY.gauge("ride_cache_hit_ratio", "Session data cache hits / lookups since process start", ["collection"])
+RERUNS = telemetry.REGISTRY.counter("ride_reruns_total", "Script reruns per page", ["page"])
+ACTIVE_SESSIONS = telemetry.REGISTRY.gauge("ride_active_sessions", "Browser sessions connected to this process")
+POOL_CONNECTIONS = telemetry.REGISTRY.gauge("ride_mongo_pool_connections", "Pooled MongoDB connections", ["state"])
+POOL_EVENTS = telemetry.REGISTRY.counter("ride_mongo_pool_events_total", "MongoDB pool checkouts, failed checkouts and clears", ["event"])
+POOL_WAIT = telemetry.REGISTRY.counter("ride_mongo_pool_wait_seconds_total", "Time spent waiting for a pooled connection")
+COMMANDS = telemetry.REGISTRY.counter("ride_mongo_commands_total", "MongoDB commands by outcome", ["command", "outcome"])
+COMMAND_SECONDS = telemetry.REGISTRY.counter("ride_mongo_command_seconds_total", "Time spent in MongoDB commands", ["command"])
+FRAME_BYTES = telemetry.REGISTRY.gauge("ride_dataframe_bytes", "Memory held by DataFrames in shared snapshots and session caches", ["scope", "name"])
 
-def get_surge_data(db):
+@st.cache_resource(show_spinner=False)
+def metrics_exporter():
+    if not METRICS_PORT:
+        return None
     try:
-        surge = list(db.surge_pricing.find({}, {'_id': 0}))
-        return pd.DataFrame(surge)
-    except Exception as e:
-        st.error(f"Error fetching surge data: {e}")
-        return pd.DataFrame()  # [web:32]
+        return telemetry.serve(METRICS_PORT, METRICS_ADDR)
+    except OSError as e:  # e.g. port taken by another app process: run without the exporter
+        print(f"metrics exporter not started on {METRICS_ADDR}:{METRICS_PORT}: {e}", file=sys.stderr)
+        return None
+
+@st.cache_resource(show_spinner=False)
+def session_caches():
+    return weakref.WeakSet()  # every session's DataCache, for ride_dataframe_bytes
+
+def frame_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sum(frame_bytes(v) for v in value) if isinstance(value, tuple) else 0
+
+def collect_state(monitor, snapshots):
+    # Runs on the exporter thread before each scrape.
+    lookups = {}
+    for (collection, result), count in CACHE_LOOKUPS.snapshot().items():
+        lookups.setdefault(collection, {"hit": 0, "miss": 0})[result] += count
+    CACHE_HIT_RATIO.replace({(c, ): row["hit"] / (row["hit"] + row["miss"]) for c, row in lookups.items()})
+    session_mgr = getattr(runtime.get_instance(), "_session_mgr", None) if runtime.exists() else None
+    ACTIVE_SESSIONS.set(session_mgr.num_active_sessions() if session_mgr is not None else 0)
+    pool, commands = monitor.snapshot()
+    POOL_CONNECTIONS.replace({("open", ): pool["open"], ("checked_out", ): pool["checked_out"]})
+    POOL_EVENTS.replace({("checkout", ): pool["checkouts"], ("checkout_failed", ): pool["checkout_failures"], ("cleared", ): pool["cleared"]})
+    POOL_WAIT.set(pool["wait_ms_total"] / 1000)
+    COMMANDS.replace({**{(name, "succeeded"): row["count"] - row["failures"] for name, row in commands.items()},
+                      **{(name, "failed"): row["failures"] for name, row in commands.items()}})
+    COMMAND_SECONDS.replace({(name, ): row["total_ms"] / 1000 for name, row in commands.items()})
+    sizes = {("snapshot", name): size for name, size in snapshots.nbytes().items()}
+    for cache in list(session_caches()):
+        for collection, size in cache.nbytes().items():
+            sizes["session_cache", collection] = sizes.get(("session_cache", collection), 0) + size
+    FRAME_BYTES.replace(sizes)
+
+# ---------- Seeding ----------
+class SeedJob:
+    # Runs reseed() on a background thread; the UI polls written/totals for progress and ETA.
+    def __init__(self, db, scale=None, batch_size=datagen.DEFAULT_BATCH_SIZE, writers=datagen.DEFAULT_WRITERS, reset="swap"):
+        self.id = f"{time.time():.6f}"
+        self.totals = datagen.collection_totals(scale)
+        self.written = dict.fromkeys(self.totals, 0)
+        self.status, self.stats, self.error = "running", None, None
+        self.started, self.finished = time.monotonic(), None
+        self.thread = threading.Thread(target=self._run, args=(db, scale, batch_size, writers, reset), name="seed-job", daemon=True)
+        self.thread.start()
+
+    def _run(self, db, scale, batch_size, writers, reset):
+        try:
+            self.stats = reseed(db, scale, batch_size, writers, reset, on_progress=self.written.__setitem__)
+            self.status = "done"
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+        self.finished = time.monotonic()
+
+    def progress(self):
+        done, total = sum(self.written.values()), sum(self.totals.values())
+        elapsed = (self.finished or time.monotonic()) - self.started
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate and self.status == "running" else None
+        return {"done": done, "total": total, "fraction": done / total if total else 1.0, "rate": rate, "eta": eta, "elapsed": elapsed}
+
+@st.cache_resource(show_spinner=False)
+def seed_jobs():
+    # Process-wide, so a seed started in one session is visible (and not restarted) in others.
+    # Starting one goes through the lock: sessions that click at once see each other's job.
+    return {"current": None, "lock": threading.Lock()}
+
+@st.fragment(run_every=1)
+def seed_progress(job):
+    p = job.progress()
+    if job.status != "running":
+        st.rerun()  # hand over to the full script to report completion
+    eta = f" · ETA {p['eta']:.0f}s" if p["eta"] is not None else ""
+    st.progress(p["fraction"], text=f"Seeding {p['done']:,}/{p['total']:,} docs · {p['rate']:,.0f} docs/sec{eta}")
+    for col, total in job.totals.items():
+        st.caption(f"{col}: {job.written[col]:,} / {total:,}")
+
+# ---------- Ride IDs ----------
+@st.cache_resource(show_spinner=False)
+def get_ride_id_allocator(_db, nonce: int = 0):
+    sync_ride_counter(_db)
+    return IdAllocator(_db, "ride_id")
+
+# ---------- Data cache (per session, TTL + LRU bounded) ----------
+CACHE_TTLS = {"rides": 15, "drivers": 30, "riders": 120, "surge_pricing": 60}  # seconds
+CACHE_MAX_BYTES = int(float(os.environ.get("RIDE_CACHE_MAX_MB", 128)) * 2**20)  # per session
+
+def cache_names(collection):
+    # A cache collection is one name, or a tuple of every collection the read depends on.
+    return collection if isinstance(collection, tuple) else (collection, )
+
+class DataCache:
+    def __init__(self, ttls=CACHE_TTLS, max_bytes=CACHE_MAX_BYTES):
+        self.ttls, self.max_bytes = ttls, max_bytes
+        self.entries = OrderedDict()  # (collection, key) -> (expires_at, value), oldest first
+        self.hits = self.misses = 0
+        self.sizes, self.total = {}, 0  # (collection, key) -> deep bytes of the stored value
+
+    def lookup(self, collection, key):
+        # Returns (hit, value); expired entries count as misses.
+        entry = self.entries.get((collection, key))
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self.entries.move_to_end((collection, key))
+            return True, entry[1]
+        self.misses += 1
+        return False, None
+
+    def store(self, collection, key, value):
+        # Evicts least recently used entries until the session's frames fit in max_bytes; a frame
+        # larger than that on its own is not kept at all.
+        self._drop((collection, key))
+        self.entries[(collection, key)] = (time.monotonic() + min(self.ttls.get(c, 30) for c in cache_names(collection)), value)
+        self.sizes[(collection, key)] = frame_bytes(value)
+        self.total += self.sizes[(collection, key)]
+        while self.entries and self.total > self.max_bytes:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, entry_key):
+        if self.entries.pop(entry_key, None) is not None:
+            self.total -= self.sizes.pop(entry_key)
+
+    def invalidate(self, *collections):
+        for key in [k for k in self.entries if not collections or set(cache_names(k[0])) & set(collections)]:
+            self._drop(key)
+
+    def nbytes(self):
+        # Bytes per collection, for the metrics thread; sizes are measured once, on store.
+        totals = {}
+        for (collection, _), size in list(self.sizes.items()):
+            if size:  # not a frame (e.g. the metrics summary)
+                totals["+".join(cache_names(collection))] = totals.get("+".join(cache_names(collection)), 0) + size
+        return totals
+
+def data_cache():
+    cache = st.session_state.get("_data_cache")
+    if cache is None:
+        cache = st.session_state["_data_cache"] = DataCache()
+        session_caches().add(cache)
+    return cache
+
+def invalidate_cache(*collections):
+    if runtime.exists():
+        data_cache().invalidate(*collections)
+
+# ---------- Page data (session-cached RideRepository reads, fetched concurrently) ----------
+# Queries live in ride_repository.py. Each *_fetch() describes one read as
+# (cache collection, cache key, loader, fallback, label); fetch_all() looks every read up in the
+# session cache on the script thread (session_state is not visible from other threads), runs the
+# misses together on a shared thread pool and caches their results, so a page waits about as
+# long as its slowest query. A failed read shows st.error and yields its fallback, so one broken
+# query never blanks the page. A cache collection of None skips the session cache.
+PAGE_FETCH_WORKERS = int(os.environ.get("RIDE_PAGE_FETCH_WORKERS", 8))
+
+@st.cache_resource(show_spinner=False)
+def fetch_pool():
+    return ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS, thread_name_prefix="page-fetch")
+
+def _detach(value):
+    # Callers may add columns, so frames go out as shallow copies of the cached ones.
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    return tuple(_detach(v) for v in value) if isinstance(value, tuple) else value
+
+def fetch_all(*fetches):
+    with profiling.section("fetch"):
+        return _fetch_all(fetches)
+
+def _fetch_all(fetches):
+    cache = data_cache() if runtime.exists() else None  # no session outside a Streamlit run: straight to Mongo
+    results, misses = [None] * len(fetches), []
+    for i, (collection, key, _, _, label) in enumerate(fetches):
+        hit, value = cache.lookup(collection, key) if cache is not None and collection else (False, None)
+        if cache is not None and collection:
+            CACHE_LOOKUPS.inc("+".join(cache_names(collection)), "hit" if hit else "miss")
+        if hit:
+            with profiling.section(f"cache hit · {label}"):
+                results[i] = value
+        else:
+            misses.append(i)
+    # Timed on whichever thread runs them. Snapshot reads (no collection) are served from memory;
+    # the store times its own loads as "snapshot <name>", so they stay out of the load series.
+    loaders = {i: profiling.wrap(f"load · {fetches[i][4]}", timed(fetches[i][4], fetches[i][2]) if fetches[i][0] else fetches[i][2]) for i in misses}
+    futures = {i: fetch_pool().submit(loaders[i]) for i in misses} if len(misses) > 1 else {}  # a lone miss runs inline
+    for i in misses:
+        collection, key, _, fallback, label = fetches[i]
+        try:
+            value = futures[i].result() if futures else loaders[i]()
+        except Exception as e:
+            LOADER_ERRORS.inc(label)
+            st.error(f"Error fetching {label}: {e}")
+            results[i] = fallback  # [web:32]
+            continue
+        if cache is not None and collection:
+            cache.store(collection, key, value)  # failures are never cached
+        results[i] = value
+    return [_detach(value) for value in results]
+
+def fetch(one):
+    return fetch_all(one)[0]
+
+def timed(label, loader):
+    def run():
+        started = time.perf_counter()
+        try:
+            return loader()
+        finally:
+            LOADER_SECONDS.observe(time.perf_counter() - started, label)
+    return run
+
+def metrics_fetch(repo):
+    return ("rides", "drivers"), ("metrics",), repo.dashboard_metrics, dict(EMPTY_METRICS), "metrics"  # active drivers come from drivers
+
+def rides_fetch(repo, columns=None, query=None, sort=RIDES_SORT):
+    return "rides", ("all", repr(columns), repr(query), repr(sort)), lambda: repo.rides(columns, query, sort), pd.DataFrame(), "rides"
+
+def rides_page_fetch(repo, columns, statuses=None, after=None, page_size=RIDES_PAGE_SIZE, since=None):
+    # Yields (frame, cursor for the next page or None).
+    key = ("page", repr(columns), repr(statuses), repr(after), page_size, repr(since))
+    return "rides", key, lambda: repo.rides_page(columns, statuses, after, page_size, since), (pd.DataFrame(columns=columns), None), "rides"
+
+TIME_WINDOWS = {"All time": None, "Last hour": timedelta(hours=1), "Last 24 hours": timedelta(days=1), "Last 7 days": timedelta(days=7)}
+
+def time_window_start(label):
+    # Rounded to the minute so reruns within a minute share cache entries and page cursors.
+    span = TIME_WINDOWS[label]
+    return ts(datetime.now().replace(second=0, microsecond=0) - span) if span else None
+
+def revenue_trend_fetch(repo, unit="day"):
+    since = revenue_since(unit)
+    return "rides", ("revenue_trend", unit, since), lambda: repo.revenue_trend(unit, since), pd.DataFrame(columns=['date', 'total_fare']), "revenue trends"
+
+SCATTER_POINTS = int(os.environ.get("RIDE_SCATTER_POINTS", 2000))  # rows drawn per scatter
+
+def trend_fetch(repo, model):
+    return "rides", ("trend", model), lambda: repo.trend(model), None, "trendline"
+
+def trend_scatter(df, model, fit, **kwargs):
+    # Downsampled points plus the stored fit, so the figure size does not grow with the data.
+    x, y = TREND_MODELS[model]
+    points = df.sample(SCATTER_POINTS, random_state=0) if len(df) > SCATTER_POINTS else df
+    fig = px.scatter(points, x=x, y=y, **kwargs)
+    if fit:
+        r2 = f"R²={fit['r2']:.2f}, " if fit["r2"] is not None else ""
+        fig.add_scatter(x=[fit["x_min"], fit["x_max"]], y=[fit["intercept"] + fit["slope"] * v for v in (fit["x_min"], fit["x_max"])],
+                        mode="lines", line=dict(color="#ef553b", width=3), name=f"OLS ({r2}n={fit['n']:,})")
+    if len(points) < len(df):
+        fig.update_layout(title=f"{kwargs.get('title', '')}<br><sup>{len(points):,} of {len(df):,} rides shown</sup>")
+    return fig
+
+# Above MAP_POINT_THRESHOLD points the map switches from raw points to grid-cell counts
+# aggregated on the server, so the browser payload is bounded by the number of cells.
+MAP_POINT_THRESHOLD = int(os.environ.get("RIDE_MAP_POINT_THRESHOLD", 20_000))
+
+def map_cells_fetch(repo, query, cell=MAP_CELL_DEGREES):
+    return "rides", ("map_cells", repr(query), cell), lambda: repo.map_cells(query, cell), pd.DataFrame(columns=['lat', 'lon', 'count', 'size']), "map cells"
+
+def map_data_fetch(repo, query, grid):
+    # Server-side grid-cell counts, or the raw pickup/dropoff coordinates.
+    return map_cells_fetch(repo, query) if grid else rides_fetch(repo, PAGE_COLUMNS["map"], query, sort=None)
+
+def ride_count_fetch(repo, query):
+    return "rides", ("count", repr(query)), lambda: repo.count_rides(query), 0, "ride count"
+
+def ride_statuses_fetch(repo):
+    return "rides", ("statuses",), repo.ride_statuses, [], "ride statuses"
+
+def riders_fetch(repo):
+    return "riders", ("all",), repo.riders, pd.DataFrame(), "riders"
+
+# ---------- Shared snapshots (process-wide) ----------
+# The unfiltered rides, drivers and surge frames are loaded by one background thread per
+# process and shared by every session, so a refresh is one scan however many viewers are
+# open. Sessions get shallow copies or column selections, never the original.
+SNAPSHOT_SECONDS = {"rides": int(os.environ.get("RIDE_SNAPSHOT_SECONDS", 30)), "drivers": 30, "surge_pricing": 60}
+ARCHIVE_EXPORT_SECONDS = int(os.environ.get("RIDE_ARCHIVE_EXPORT_SECONDS", 3600))  # see export_archive in ride_repository.py
+
+class SnapshotStore:
+    def __init__(self, db, intervals=SNAPSHOT_SECONDS):
+        self.db, self.intervals = db, intervals
+        self.archive = archive.ArchiveReader(ARCHIVE_DIR) if archive_enabled() else None
+        self.exported = 0.0  # monotonic time of the last archive export
+        self.loaders = {
+            "rides": lambda: load_rides_snapshot(db, self.archive),
+            "drivers": RideRepository(db).drivers,
+            "surge_pricing": RideRepository(db).surge,
+        }
+        self.frames = {}      # name -> (loaded_at, frame); replaced whole, never mutated
+        self.attempted = {}   # name -> monotonic time of the last load attempt
+        self.errors, self.loads = {}, dict.fromkeys(self.loaders, 0)
+        self.sizes = {}       # name -> (loaded_at, bytes), see nbytes()
+        self.stale = set(self.loaders)
+        self.lock = threading.RLock()  # one load at a time, background or first-viewer
+        self.wake, self.stopped = threading.Event(), threading.Event()
+        threading.Thread(target=self._run, name="snapshot-loader", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake.set()
+
+    def _load(self, name):
+        with self.lock:
+            self.attempted[name] = time.monotonic()
+            try:
+                entry = self.frames[name] = (time.monotonic(), timed(f"snapshot {name.replace('_', ' ')}", self.loaders[name])())
+            except Exception as e:
+                self.errors[name] = str(e)
+                raise
+            self.errors.pop(name, None)
+            self.loads[name] += 1
+            return entry
+
+    def _export(self):
+        self.exported = time.monotonic()
+        try:
+            if export_archive(self.db):
+                self.stale.add("rides")
+            self.errors.pop("archive", None)
+        except Exception as e:
+            self.errors["archive"] = str(e)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wake.clear()
+            if self.archive is not None and time.monotonic() - self.exported >= ARCHIVE_EXPORT_SECONDS:
+                self._export()
+            for name, interval in self.intervals.items():
+                if name in self.stale or time.monotonic() - self.attempted.get(name, 0) >= interval:
+                    self.stale.discard(name)
+                    try:
+                        self._load(name)
+                    except Exception:
+                        pass  # kept in self.errors; the previous frame stays in service
+            now = time.monotonic()
+            self.wake.wait(max(0.5, min(self.attempted.get(n, 0) + i - now for n, i in self.intervals.items())))
+
+    def refresh(self, *names, since=None):
+        # Reload soon; `since` (monotonic) skips frames already loaded after that moment.
+        if not names:
+            self.exported = 0.0  # e.g. after a reseed: re-export the archive too
+        for name in names or self.loaders:
+            entry = self.frames.get(name)
+            if since is None or entry is None or entry[0] < since:
+                self.stale.add(name)
+        self.wake.set()
+
+    def frame(self, name, columns=None):
+        entry = self.frames.get(name)
+        if entry is None:
+            with self.lock:  # first viewer loads synchronously; concurrent ones wait for it
+                entry = self.frames.get(name) or self._load(name)
+        # Shallow copies: pages only filter frames or add columns, which never writes into the
+        # shared arrays (pandas 3 copy-on-write also covers in-place edits). Keep it that way.
+        return entry[1][columns] if columns else entry[1].copy(deep=False)
+
+    def nbytes(self):
+        # Frames are replaced whole, so each one is measured once per load.
+        for name, (loaded_at, frame) in list(self.frames.items()):
+            if self.sizes.get(name, (None, ))[0] != loaded_at:
+                self.sizes[name] = (loaded_at, frame_bytes(frame))
+        return {name: size for name, (_, size) in self.sizes.items()}
+
+    def status(self):
+        now = time.monotonic()
+        return {name: {"age": now - self.frames[name][0] if name in self.frames else None, "rows": len(self.frames[name][1]) if name in self.frames else 0,
+                       "loads": self.loads[name], "error": self.errors.get(name)} for name in self.loaders}
+
+@st.cache_resource(show_spinner=False)
+def get_snapshots(_db, nonce: int = 0):
+    store = SnapshotStore(page_db(_db, "analytics"))  # full scans follow the analytics read routing
+    return owned(store, store.stop)
+
+def snapshot_fetch(snapshots, name, columns=None):
+    # Shared frames are already process-cached, so they skip the session cache.
+    return None, None, lambda: snapshots.frame(name, columns), pd.DataFrame(), name.replace('_', ' ')
+
+# ---------- Live ride feed (change streams, polling fallback) ----------
+LIVE_WINDOW = 5000          # most recent rides kept in memory
+LIVE_LOG_SIZE = 10_000      # deltas retained for sessions catching up
+LIVE_POLL_SECONDS = 2
+CHANGE_STREAMS_UNSUPPORTED = 40573  # "$changeStream is only supported on replica sets"
+
+class RideWatcher:
+    # Keeps the newest LIVE_WINDOW rides in memory and records every change as a versioned
+    # delta, so sessions only pull what changed since the version they last rendered.
+    def __init__(self, db, columns, window=LIVE_WINDOW):
+        self.db, self.window = db, window
+        self.projection = {c: 1 for c in dict.fromkeys([*columns, 'request_time', 'ride_id'])}
+        self.lock = threading.Lock()
+        self.rides = {}                           # _id -> projected ride
+        self.log = deque(maxlen=LIVE_LOG_SIZE)    # (version, _id, ride or None when removed)
+        self.version = self.reset_version = 0
+        self.mode, self.error = "starting", None
+        self.stopped = threading.Event()
+        threading.Thread(target=self._run, name="ride-watcher", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def changes_since(self, version):
+        # ("full", version, rides) when the caller is too far behind, else ("delta", version, changes).
+        with self.lock:
+            if version is None or version < self.reset_version or (self.log and version < self.log[0][0] - 1):
+                return "full", self.version, list(self.rides.items())
+            return "delta", self.version, [(_id, ride) for v, _id, ride in self.log if v > version]
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self._watch()
+            except OperationFailure as e:
+                if e.code != CHANGE_STREAMS_UNSUPPORTED:
+                    self.error = str(e)
+                    self.stopped.wait(LIVE_POLL_SECONDS)
+                    continue
+                try:
+                    self._poll()
+                except PyMongoError as e:
+                    self.error = str(e)
+                    self.stopped.wait(LIVE_POLL_SECONDS)
+            except PyMongoError as e:
+                self.error = str(e)
+                self.stopped.wait(LIVE_POLL_SECONDS)
+
+    def _resync(self):
+        rides = {r['_id']: r for r in self.db.rides.find({}, self.projection).sort(RIDES_SORT).limit(self.window)}
+        with self.lock:
+            self.rides, self.version = rides, self.version + 1
+            self.reset_version = self.version
+            self.log.clear()
+
+    def _apply(self, changes):
+        with self.lock:
+            for _id, ride in changes:
+                self.version += 1
+                if ride is None:
+                    self.rides.pop(_id, None)
+                else:
+                    self.rides[_id] = ride
+                self.log.append((self.version, _id, ride))
+            if len(self.rides) > self.window * 1.1:
+                newest = sorted(self.rides.items(), key=lambda kv: (str(kv[1].get('request_time') or ''), kv[1].get('ride_id') or ''), reverse=True)
+                for _id, _ in newest[self.window:]:
+                    self.version += 1
+                    del self.rides[_id]
+                    self.log.append((self.version, _id, None))
+
+    def _watch(self):
+        # Open the stream before loading the snapshot so nothing written in between is missed;
+        # replaying an event the snapshot already contains is a harmless upsert.
+        with self.db.rides.watch(full_document="updateLookup", max_await_time_ms=LIVE_POLL_SECONDS * 1000) as stream:
+            self._resync()
+            self.mode, self.error = "change stream", None
+            while stream.alive and not self.stopped.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                op = change["operationType"]
+                if op in ("insert", "update", "replace"):
+                    doc = change.get("fullDocument")
+                    _id = change["documentKey"]["_id"]
+                    self._apply([(_id, {"_id": _id, **{c: doc.get(c) for c in self.projection}} if doc else None)])
+                elif op == "delete":
+                    self._apply([(change["documentKey"]["_id"], None)])
+                else:  # drop / rename / invalidate: the stream is closing, reopen and resync
+                    return
+
+    def _poll(self):
+        # Standalone mongod: new rides are found by _id (ObjectIds increase with insert time),
+        # status changes by updated_at (set on every transition, indexed); a reseed is detected
+        # when the newest known ride disappears.
+        self._resync()
+        self.mode, self.error = "polling", None
+        last_id, mark = self._poll_marks()
+        while not self.stopped.wait(LIVE_POLL_SECONDS):
+            if last_id is not None and self.db.rides.find_one({"_id": last_id}, {"_id": 1}) is None:
+                self._resync()
+                last_id, mark = self._poll_marks()
+                continue
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            new = list(self.db.rides.find(query, self.projection).sort("_id", 1).limit(self.window))
+            if new:
+                self._apply([(r['_id'], r) for r in new])
+                last_id = new[-1]['_id']
+            mark = self._poll_updates(mark)
+
+    def _poll_marks(self):
+        with self.lock:
+            last_id = max(self.rides, default=None)
+        latest = self.db.rides.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        return last_id, (latest["updated_at"], {latest["_id"]}) if latest else (None, set())
+
+    def _poll_updates(self, mark):
+        # mark = (updated_at, _ids already applied at that instant); $gte plus the _id set keeps
+        # changes that share a timestamp with the previous poll's last one.
+        since, seen = mark
+        query = {"updated_at": {"$gte": since} if since is not None else {"$exists": True}}
+        rows = list(self.db.rides.find(query, {**self.projection, "updated_at": 1}).sort("updated_at", 1).limit(self.window))
+        fresh = [r for r in rows if not (r["updated_at"] == since and r["_id"] in seen)]
+        if fresh:
+            self._apply([(r['_id'], {k: v for k, v in r.items() if k != "updated_at"}) for r in fresh])
+        if not rows:
+            return mark
+        last = rows[-1]["updated_at"]
+        return last, {r["_id"] for r in rows if r["updated_at"] == last} | (seen if last == since else set())
+
+@st.cache_resource(show_spinner=False)
+def get_ride_watcher(_db, nonce: int = 0):
+    watcher = RideWatcher(_db, PAGE_COLUMNS["realtime"])
+    return owned(watcher, watcher.stop)
+
+def live_rides_frame(watcher):
+    # Apply only the deltas since this session's last render to its own copy of the frame. Versions
+    # are per watcher, so after a reconnect the new watcher starts this session from a full copy.
+    state = st.session_state.get("_live_rides")
+    if state is not None and state["watcher"] is not watcher:
+        state = None
+    kind, version, changes = watcher.changes_since(state["version"] if state else None)
+    if kind == "full":
+        df = rides_frame([ride for _, ride in changes], ['_id', *watcher.projection]).set_index('_id')
+        applied = len(changes)
+    else:
+        df, applied = state["frame"], len(changes)
+        if changes:
+            latest = dict(changes)  # later deltas for the same ride win
+            upserts = [ride for ride in latest.values() if ride is not None]
+            df = df.drop(index=list(latest), errors='ignore')
+            if upserts:
+                df = pd.concat([df, rides_frame(upserts, ['_id', *watcher.projection]).set_index('_id')])
+    if kind == "full" or changes:
+        df = df.sort_values(['request_time', 'ride_id'], ascending=False)
+    st.session_state["_live_rides"] = {"watcher": watcher, "version": version, "frame": df}
+    return df, applied
+
+@st.fragment(run_every=LIVE_POLL_SECONDS)
+def live_rides_table(watcher, status_filter, since=None):
+    df, applied = live_rides_frame(watcher)
+    shown = df[df['status'].isin(status_filter)]
+    if since is not None:
+        shown = shown[shown['request_time'] >= pd.Timestamp(since)]
+    st.dataframe(shown[PAGE_COLUMNS["realtime"]].head(RIDES_PAGE_SIZE * 4), use_container_width=True, hide_index=True)
+    note = f" · ⚠️ {watcher.error}" if watcher.error else ""
+    st.caption(f"🔴 Live via {watcher.mode} · {len(df)} rides in window · {applied} changes applied this refresh{note}")
+
+# ---------- Ride status changes ----------
+RIDE_ACTIONS = {"▶️ Start": "in_progress", "✅ Complete": "completed", "✖️ Cancel": "cancelled"}
+
+def ride_status_form(db, page_df):
+    # Status changes for the open rides on the current table page. Completions update the revenue
+    # rollup and trendline sums as they are written (see complete_ride in ride_repository.py); the
+    # shared rides snapshot picks the change up on its RIDE_SNAPSHOT_SECONDS schedule.
+    open_rides = page_df[page_df['status'].isin(list(RIDE_TRANSITIONS))] if 'status' in page_df else page_df
+    with st.expander("🛠️ Update Ride Status"):
+        if open_rides.empty:
+            st.caption("No pending or in-progress rides on this page.")
+            return
+        with st.form("ride_status_form"):
+            ride_id = st.selectbox("Ride", open_rides['ride_id'].tolist(), format_func=lambda r: f"{r} ({open_rides.loc[open_rides['ride_id'] == r, 'status'].iloc[0]})")
+            action = st.radio("Action", list(RIDE_ACTIONS), horizontal=True)
+            rating = st.slider("Rating (on completion)", 1.0, 5.0, 5.0, 0.5)
+            if not st.form_submit_button("Apply", use_container_width=True):
+                return
+        try:
+            ride = advance_ride(db, ride_id, RIDE_ACTIONS[action], rating)
+        except PyMongoError as e:
+            st.error(f"❌ Error updating ride: {e}")
+            return
+        if ride is None:
+            st.warning(f"⚠️ {ride_id} cannot be moved to {RIDE_ACTIONS[action].replace('_', ' ')} from its current status.")
+            return
+        invalidate_cache("rides")
+        st.success(f"✅ {ride_id} is now {ride['status'].replace('_', ' ')}.")
+
+# ---------- Charts ----------
+def chart(name, build):
+    # Figure build and st.plotly_chart are profiled as separate sections.
+    with profiling.section(f"figure · {name}"):
+        fig = build()
+    with profiling.section(f"plotly_chart · {name}"):
+        st.plotly_chart(fig, use_container_width=True)
+
 
 # ---------- App ----------
-def main():
+def render():
     st.markdown('<h1 class="main-header">🚗 Ride-Sharing Intelligence System</h1>', unsafe_allow_html=True)  # [web:29]
 
     # Robust connection with retry
-    nonce = st.session_state.get("_mongo_nonce", 0)
+    nonce = connection_state()["nonce"]
     try:
-        db = get_db(nonce)
+        with profiling.section("connect"):
+            db = get_db(nonce)
     except (ServerSelectionTimeoutError, OperationFailure) as e:
         st.error(f"❌ MongoDB connection failed: {e}")
         colr1, colr2 = st.columns([1,1])
@@ -195,32 +713,86 @@ def main():
             if st.button("🔁 Retry Connection", use_container_width=True):
                 force_reconnect()
         with colr2:
-            st.info("Ensure mongod is running on localhost:27017, then click Retry.")  # [web:32]
+            st.info(f"Ensure MongoDB is reachable at {redacted_uri()}, then click Retry.")  # [web:32]
         return
 
+    with profiling.section("snapshots"):
+        snapshots = get_snapshots(db, nonce)
+    monitor = get_monitor()
+    telemetry.REGISTRY.collector("app", lambda: collect_state(monitor, snapshots))  # latest connection's snapshots
+
     # Sidebar
-    with st.sidebar:
+    with st.sidebar, profiling.section("sidebar"):
         st.title("Navigation")  # [web:29]
-        if st.button("🔄 Initialize Database", use_container_width=True):
-            with st.spinner("Initializing database with sample data..."):
-                if initialize_database(db):
-                    st.success("✅ Database initialized successfully!")
-                    st.balloons()
-                    st.rerun()  # refresh UI after seeding [web:89]
+        with st.expander("⚙️ Seed Settings"):
+            scale = {
+                "rides": st.number_input("Rides", min_value=1, value=datagen.DEMO_SCALE["rides"], step=1000),
+                "drivers": st.number_input("Drivers", min_value=1, value=datagen.DEMO_SCALE["drivers"], step=100),
+                "riders": st.number_input("Riders", min_value=1, value=datagen.DEMO_SCALE["riders"], step=100),
+                "zones": st.number_input("Surge Zones", min_value=1, value=datagen.DEMO_SCALE["zones"], step=10),
+            }
+            batch_size = st.number_input("Batch Size", min_value=100, value=datagen.DEFAULT_BATCH_SIZE, step=1000)
+            writers = st.number_input("Writer Threads", min_value=1, max_value=32, value=datagen.DEFAULT_WRITERS)
+            reset = st.radio("Reset Mode", RESET_MODES, horizontal=True, help="swap: load into staging collections and rename them over the live ones. drop: drop the live collections first.")
+        jobs = seed_jobs()
+        job = jobs["current"]
+        running = job is not None and job.status == "running"
+        st.session_state.setdefault("_seen_seed_job", job.id if job is not None and not running else None)  # new sessions skip old results
+        if st.button("🔄 Initialize Database", use_container_width=True, disabled=running):
+            with jobs["lock"]:
+                if jobs["current"] is None or jobs["current"].status != "running":
+                    jobs["current"] = SeedJob(db, scale, int(batch_size), int(writers), reset)
+                job, running = jobs["current"], True
+        if running:
+            seed_progress(job)
+        elif job is not None and st.session_state.get("_seen_seed_job") != job.id:
+            # First rerun of this session since the job finished: drop stale cached frames.
+            st.session_state["_seen_seed_job"] = job.id
+            invalidate_cache()
+            snapshots.refresh(since=job.finished)
+            if job.status == "done":
+                p = job.progress()
+                st.success(f"✅ Seeded {p['done']:,} documents in {p['elapsed']:.1f}s ({p['rate']:,.0f} docs/sec)")
+                st.balloons()
+            else:
+                st.error(f"Database Initialization Error: {job.error}")
         st.divider()
-        page = st.radio("Select View", ["📊 Dashboard","🚕 Real-Time Rides","👨‍✈️ Driver Management","📈 Surge Pricing","📉 Analytics","➕ Add New Ride"])
+        page_key = st.radio("Select View", list(PAGE_LABELS), format_func=PAGE_LABELS.get, key="_page")  # keyed, so headless runs can preselect a page
+        page = PAGE_LABELS[page_key]
+        RERUNS.inc(page_key)
         st.divider()
-        try:
-            db.command('ping')
-            st.success("🟢 MongoDB Connected")
-        except Exception:
+        with profiling.section("ping"):
+            healthy, ping_ms = mongo_health(db, nonce)
+        if healthy:
+            st.success(f"🟢 MongoDB Connected ({ping_ms:.1f} ms)")
+        else:
             st.error("🔴 MongoDB Disconnected")
         if st.button("🔁 Reconnect to MongoDB", use_container_width=True):
             force_reconnect()
+        with st.expander("🩺 Diagnostics"):
+            pool, commands = get_monitor().snapshot()
+            st.caption(f"Pool: {pool['checked_out']} checked out · {pool['open']} open · {pool['checkouts']:,} checkouts · wait avg {pool['wait_ms_avg']:.2f} ms / max {pool['wait_ms_max']:.2f} ms · {pool['checkout_failures']} failed · {pool['cleared']} cleared")
+            st.caption("Settings: " + ", ".join(f"{k}={v}" for k, v in pool_settings().items()))
+            if commands:
+                latency = pd.DataFrame.from_dict(commands, orient='index').rename_axis('command').reset_index()
+                latency['avg_ms'] = latency['total_ms'] / latency['count']
+                st.dataframe(latency[['command','count','avg_ms','max_ms','failures']].sort_values('count', ascending=False).round(2), use_container_width=True, hide_index=True)
+        snapshot_rows = [f"{name.replace('_', ' ')} {row['rows']:,} rows, {row['age']:.0f}s old" + (" ⚠️" if row["error"] else "") for name, row in snapshots.status().items() if row["age"] is not None]
+        st.caption("📸 Shared: " + " · ".join(snapshot_rows) if snapshot_rows else "📸 Shared: not loaded yet")
+        cache = data_cache()
+        lookups = cache.hits + cache.misses
+        st.caption(f"🗃️ Cache: {cache.hits} hits · {cache.misses} misses · {cache.hits / lookups:.0%} hit rate" if lookups else "🗃️ Cache: empty")
+
+    # Reads go through the page's routed handle (PAGE_KEYS / MONGO_CONFIG); writes and the live
+    # change stream stay on the primary `db`.
+    repo = RideRepository(page_db(db, page_key))
 
     # Dashboard
     if page == "📊 Dashboard":
-        metrics = get_dashboard_metrics(db)
+        # All four reads start together; the Granularity radio further down is read from its state.
+        unit = st.session_state.get("_revenue_unit", next(iter(ROLLUP_UNITS)))
+        metrics, rides_df, drivers_df, daily_revenue = fetch_all(
+            metrics_fetch(repo), snapshot_fetch(snapshots, "rides", PAGE_COLUMNS["dashboard"]), snapshot_fetch(snapshots, "drivers"), revenue_trend_fetch(repo, unit))
         col1, col2, col3, col4 = st.columns(4)
         with col1: st.metric("Total Rides", metrics['total_rides'], "↑ 12%")
         with col2: st.metric("Active Drivers", metrics['active_drivers'], "↑ 5%")
@@ -228,17 +800,15 @@ def main():
         with col4: st.metric("Avg Rating", f"⭐ {metrics['avg_rating']}", "↑ 0.2")
 
         st.divider()
-        rides_df = get_all_rides(db)
-        drivers_df = get_all_drivers(db)
 
         c1, c2 = st.columns(2)
         with c1:
             st.subheader("📊 Ride Status Distribution")
             if not rides_df.empty:
                 status_counts = rides_df['status'].value_counts()
-                fig = px.pie(values=status_counts.values, names=status_counts.index, color_discrete_sequence=px.colors.qualitative.Set3, hole=0.3)
-                fig.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig, use_container_width=True)
+                status_counts = status_counts[status_counts > 0]  # categorical: skip unused categories
+                chart("ride status", lambda: px.pie(values=status_counts.values, names=status_counts.index, color_discrete_sequence=px.colors.qualitative.Set3, hole=0.3)
+                      .update_traces(textposition='inside', textinfo='percent+label'))
             else:
                 st.info("No ride data. Initialize the database.")
 
@@ -246,50 +816,87 @@ def main():
             st.subheader("🚗 Driver Availability")
             if not drivers_df.empty:
                 status_counts = drivers_df['status'].value_counts()
-                fig = px.bar(x=status_counts.index, y=status_counts.values, color=status_counts.index, labels={'x': 'Status', 'y': 'Count'}, color_discrete_sequence=px.colors.qualitative.Bold)
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
+                status_counts = status_counts[status_counts > 0]
+                chart("driver availability", lambda: px.bar(x=status_counts.index, y=status_counts.values, color=status_counts.index, labels={'x': 'Status', 'y': 'Count'}, color_discrete_sequence=px.colors.qualitative.Bold)
+                      .update_layout(showlegend=False))
             else:
                 st.info("No driver data. Initialize the database.")
 
-        st.subheader("💰 Revenue Trends (Last 7 Days)")
-        if not rides_df.empty and 'request_time' in rides_df.columns:
-            rides_df['date'] = rides_df['request_time'].dt.date
-            daily_revenue = rides_df[rides_df['status'] == 'completed'].groupby('date')['total_fare'].sum().reset_index()
+        rt1, rt2 = st.columns([3,1])
+        with rt2:
+            unit = st.radio("Granularity", list(ROLLUP_UNITS), format_func={"day": "Daily", "hour": "Hourly"}.get, horizontal=True, label_visibility="collapsed", key="_revenue_unit")
+        with rt1:
+            st.subheader("💰 Revenue Trends (Last 7 Days)" if unit == "day" else "💰 Revenue Trends (Last 48 Hours)")
+        if not rides_df.empty:
             if not daily_revenue.empty:
-                fig = px.line(daily_revenue, x='date', y='total_fare', markers=True, labels={'total_fare': 'Revenue ($)', 'date': 'Date'})
-                fig.update_traces(line_color='#667eea', line_width=3)
-                st.plotly_chart(fig, use_container_width=True)
+                chart("revenue trend", lambda: px.line(daily_revenue, x='date', y='total_fare', markers=True, labels={'total_fare': 'Revenue ($)', 'date': 'Date'})
+                      .update_traces(line_color='#667eea', line_width=3))
             else:
                 st.info("No completed rides to show revenue trends.")
 
     elif page == "🚕 Real-Time Rides":
         st.subheader("🚕 Real-Time Ride Monitoring")
-        rides_df = get_all_rides(db)
-        if not rides_df.empty:
-            f1, _ = st.columns([2,1])
+        statuses = fetch(ride_statuses_fetch(repo))
+        if statuses:
+            f1, f2 = st.columns([2,1])
             with f1:
-                status_filter = st.multiselect("Filter by Status", rides_df['status'].unique().tolist(), default=rides_df['status'].unique().tolist())
-            filtered_rides = rides_df[rides_df['status'].isin(status_filter)]
-            st.dataframe(filtered_rides[['ride_id','driver_id','rider_id','status','distance_km','total_fare','surge_multiplier','request_time']], use_container_width=True, hide_index=True)
+                status_filter = st.multiselect("Filter by Status", statuses, default=statuses)
+            with f2:
+                window = st.selectbox("Time Window", list(TIME_WINDOWS))
+            since = time_window_start(window)
+            live = st.toggle("🔴 Live updates", key="_live_toggle")
+            # Page cursors are kept per filter; changing the filter starts again at page 1.
+            pager = st.session_state.get("_rides_pager")
+            if pager is None or pager["filter"] != (status_filter, window):
+                pager = st.session_state["_rides_pager"] = {"filter": (status_filter, window), "cursors": [None]}
+            # The table page loads alongside the map's first read: the point count in Auto mode (it
+            # picks points or grid), otherwise the map data itself. Map Mode is read from its state.
+            map_query = keyset_query(status_filter, since=since)
+            map_mode = st.session_state.get("_map_mode", "Auto")
+            map_first = ride_count_fetch(repo, map_query) if map_mode == "Auto" else map_data_fetch(repo, map_query, map_mode == "Grid")
+            map_data, *table = fetch_all(map_first, *([] if live else [rides_page_fetch(repo, PAGE_COLUMNS["realtime"], status_filter, pager["cursors"][-1], since=since)]))
+            if live:
+                live_rides_table(get_ride_watcher(db, nonce), status_filter, since)
+            else:
+                page_df, next_after = table[0]
+                st.dataframe(page_df, use_container_width=True, hide_index=True)
+                p1, p2, p3 = st.columns([1,2,1])
+                with p1:
+                    if st.button("◀ Newer", use_container_width=True, disabled=len(pager["cursors"]) == 1):
+                        pager["cursors"].pop()
+                        st.rerun()
+                with p2:
+                    st.caption(f"Page {len(pager['cursors'])} · {RIDES_PAGE_SIZE} rides per page")
+                with p3:
+                    if st.button("Older ▶", use_container_width=True, disabled=next_after is None):
+                        pager["cursors"].append(next_after)
+                        st.rerun()
+                ride_status_form(db, page_df)
             st.subheader("📍 Ride Locations Map")
-            map_data = []
-            for _, ride in filtered_rides.iterrows():
-                for key in ["pickup_location","dropoff_location"]:
-                    try:
-                        map_data.append({'lat': ride[key]['lat'], 'lon': ride[key]['lng']})
-                    except Exception:
-                        pass
-            if map_data:
-                st.map(pd.DataFrame(map_data), zoom=11)
+            st.radio("Map Mode", ["Auto", "Points", "Grid"], horizontal=True, help=f"Auto switches to grid cells above {MAP_POINT_THRESHOLD:,} points.", key="_map_mode")
+            grid = map_mode == "Grid"
+            if map_mode == "Auto":
+                grid = map_data * 2 > MAP_POINT_THRESHOLD  # a pickup and a dropoff per ride
+                map_data = fetch(map_data_fetch(repo, map_query, grid))
+            if grid:
+                cells = map_data
+                if not cells.empty:
+                    st.map(cells, latitude='lat', longitude='lon', size='size', color='#764ba2aa', zoom=11)
+                    st.caption(f"{int(cells['count'].sum()):,} points binned into {len(cells):,} cells of {MAP_CELL_DEGREES}°")
+                else:
+                    st.info("No location data available for mapping.")
             else:
-                st.info("No location data available for mapping.")
+                map_data = map_points(map_data)
+                if not map_data.empty:
+                    st.map(map_data, zoom=11)
+                else:
+                    st.info("No location data available for mapping.")
         else:
             st.warning("⚠️ No rides found. Initialize the database.")
 
     elif page == "👨‍✈️ Driver Management":
         st.subheader("👨‍✈️ Driver Performance Dashboard")
-        drivers_df = get_all_drivers(db)
+        drivers_df = fetch(snapshot_fetch(snapshots, "drivers"))
         if not drivers_df.empty:
             c1, c2 = st.columns([2,1])
             with c1:
@@ -297,57 +904,56 @@ def main():
             with c2:
                 st.subheader("🏆 Top Performers")
                 for _, driver in drivers_df.nlargest(5, 'earnings_today').iterrows():
-                    st.metric(driver['name'], f"${driver['earnings_today']:.2f}", f"⭐ {driver['rating']}")
+                    st.metric(driver['name'], f"${driver['earnings_today']:.2f}", f"⭐ {driver['rating']:.2f}")
             c3, c4 = st.columns(2)
             with c3:
                 st.subheader("📊 Driver Ratings Distribution")
-                st.plotly_chart(px.histogram(drivers_df, x='rating', nbins=20, color_discrete_sequence=['#764ba2']).update_layout(xaxis_title="Rating", yaxis_title="Drivers"), use_container_width=True)
+                chart("driver ratings", lambda: px.histogram(drivers_df, x='rating', nbins=20, color_discrete_sequence=['#764ba2']).update_layout(xaxis_title="Rating", yaxis_title="Drivers"))
             with c4:
                 st.subheader("💰 Top 10 Earnings")
                 top_earn = drivers_df.nlargest(10, 'earnings_today')
-                st.plotly_chart(px.bar(top_earn, x='name', y='earnings_today', color='earnings_today', color_continuous_scale='Viridis').update_layout(xaxis_title="Driver", yaxis_title="Earnings ($)"), use_container_width=True)
+                chart("top earnings", lambda: px.bar(top_earn, x='name', y='earnings_today', color='earnings_today', color_continuous_scale='Viridis').update_layout(xaxis_title="Driver", yaxis_title="Earnings ($)"))
         else:
             st.warning("⚠️ No drivers found. Initialize the database.")
 
     elif page == "📈 Surge Pricing":
         st.subheader("📈 Surge Pricing & Demand Analysis")
-        surge_df = get_surge_data(db)
+        surge_df = fetch(snapshot_fetch(snapshots, "surge_pricing"))
         if not surge_df.empty:
             c1, c2 = st.columns(2)
             with c1:
                 st.subheader("🔥 Current Surge Multipliers")
-                fig = px.bar(surge_df, x='zone_name', y='current_surge', color='current_surge', color_continuous_scale='Reds')
-                fig.update_layout(xaxis_title="Zone", yaxis_title="Surge Multiplier"); fig.update_xaxes(tickangle=-45)
-                st.plotly_chart(fig, use_container_width=True)
+                chart("surge multipliers", lambda: px.bar(surge_df, x='zone_name', y='current_surge', color='current_surge', color_continuous_scale='Reds')
+                      .update_layout(xaxis_title="Zone", yaxis_title="Surge Multiplier").update_xaxes(tickangle=-45))
             with c2:
                 st.subheader("📊 Demand vs Supply")
-                st.plotly_chart(px.scatter(surge_df, x='available_drivers', y='active_requests', size='current_surge', color='demand_level', hover_data=['zone_name'], color_discrete_map={'low':'green','medium':'yellow','high':'orange','very_high':'red'}), use_container_width=True)
+                chart("demand vs supply", lambda: px.scatter(surge_df, x='available_drivers', y='active_requests', size='current_surge', color='demand_level', hover_data=['zone_name'], color_discrete_map={'low':'green','medium':'yellow','high':'orange','very_high':'red'}))
             st.subheader("📋 Zone Details")
             st.dataframe(surge_df[['zone_name','current_surge','demand_level','available_drivers','active_requests','avg_wait_time']], use_container_width=True, hide_index=True)
             high_surge = surge_df[surge_df['current_surge'] > 2.0]
             if not high_surge.empty:
                 st.warning(f"⚠️ High Surge Alert: {len(high_surge)} zones above 2.0x")
                 for _, zone in high_surge.iterrows():
-                    st.error(f"🔴 {zone['zone_name']}: {zone['current_surge']}x | {zone['active_requests']} requests | {zone['available_drivers']} drivers")
+                    st.error(f"🔴 {zone['zone_name']}: {zone['current_surge']:.1f}x | {zone['active_requests']} requests | {zone['available_drivers']} drivers")
         else:
             st.warning("⚠️ No surge data. Initialize the database.")
 
     elif page == "📉 Analytics":
         st.subheader("📉 Advanced Analytics & Insights")
-        rides_df = get_all_rides(db)
+        rides_df, duration_fit, rating_fit = fetch_all(snapshot_fetch(snapshots, "rides", PAGE_COLUMNS["analytics"]), trend_fetch(repo, "duration_distance"), trend_fetch(repo, "rating_fare"))
         if not rides_df.empty:
             tab1, tab2, tab3 = st.tabs(["Trip Efficiency","Revenue Analysis","Performance Metrics"])
             with tab1:
                 c1, c2 = st.columns(2)
-                completed = rides_df[rides_df['status'] == 'completed']
+                completed = rides_df[rides_df['status'] == 'completed'].astype({'duration_minutes': 'float64'})  # plotly wants plain floats, not Int16 with NA
                 with c1:
                     st.subheader("⏱️ Duration vs Distance")
                     if not completed.empty:
-                        st.plotly_chart(px.scatter(completed, x='distance_km', y='duration_minutes', color='surge_multiplier', size='total_fare', trendline='ols'), use_container_width=True)
+                        chart("duration vs distance", lambda: trend_scatter(completed, "duration_distance", duration_fit, color='surge_multiplier', size='total_fare'))
                 with c2:
                     st.subheader("📏 Distance Distribution")
                     if not completed.empty:
-                        st.plotly_chart(px.box(completed, y='distance_km', color_discrete_sequence=['#667eea']), use_container_width=True)
+                        chart("distance distribution", lambda: px.box(completed, y='distance_km', color_discrete_sequence=['#667eea']))
                 if not completed.empty:
                     avg_speed = completed['distance_km'].sum() / max(1, completed['duration_minutes'].sum())
                     st.metric("Average Speed (km/min)", f"{avg_speed:.2f}")
@@ -355,23 +961,23 @@ def main():
                 st.subheader("💵 Revenue Breakdown")
                 c1, c2 = st.columns(2)
                 with c1:
-                    revenue_by_status = rides_df.groupby('status')['total_fare'].sum()
-                    st.plotly_chart(px.pie(values=revenue_by_status.values, names=revenue_by_status.index, title="Revenue by Ride Status", hole=0.3), use_container_width=True)
+                    revenue_by_status = rides_df.groupby('status', observed=True)['total_fare'].sum()
+                    chart("revenue by status", lambda: px.pie(values=revenue_by_status.values, names=revenue_by_status.index, title="Revenue by Ride Status", hole=0.3))
                 with c2:
                     safe = rides_df[rides_df['distance_km'] > 0].copy()
                     if not safe.empty:
                         safe['fare_per_km'] = safe['total_fare'] / safe['distance_km']
-                        st.plotly_chart(px.histogram(safe[safe['fare_per_km'] < 50], x='fare_per_km', nbins=30, title="Fare per Kilometer Distribution"), use_container_width=True)
+                        chart("fare per km", lambda: px.histogram(safe[safe['fare_per_km'] < 50], x='fare_per_km', nbins=30, title="Fare per Kilometer Distribution"))
             with tab3:
                 st.subheader("⭐ Rating Analysis")
                 rated = rides_df[(rides_df['status'] == 'completed') & (rides_df['rating'].notna())]
                 if not rated.empty:
                     c1, c2 = st.columns(2)
                     with c1:
-                        rd = rated['rating'].value_counts().sort_index()
-                        st.plotly_chart(px.bar(x=rd.index, y=rd.values, labels={'x':'Rating','y':'Count'}, title="Rating Distribution"), use_container_width=True)
+                        rd = rated['rating'].astype('float64').round(1).value_counts().sort_index()  # float32 -> clean 0.1 steps on the axis
+                        chart("rating distribution", lambda: px.bar(x=rd.index, y=rd.values, labels={'x':'Rating','y':'Count'}, title="Rating Distribution"))
                     with c2:
-                        st.plotly_chart(px.scatter(rated, x='total_fare', y='rating', trendline='ols', title="Fare vs Rating"), use_container_width=True)
+                        chart("fare vs rating", lambda: trend_scatter(rated, "rating_fare", rating_fit, title="Fare vs Rating"))
                 else:
                     st.info("No completed rides with ratings yet.")
         else:
@@ -379,8 +985,7 @@ def main():
 
     elif page == "➕ Add New Ride":
         st.subheader("➕ Request New Ride")
-        drivers_df = get_all_drivers(db)
-        riders_df = pd.DataFrame(list(db.riders.find({}, {'_id': 0})))
+        drivers_df, riders_df = fetch_all(snapshot_fetch(snapshots, "drivers"), riders_fetch(repo))
         if not drivers_df.empty and not riders_df.empty:
             available = drivers_df[drivers_df['status'] == 'available']
             if available.empty:
@@ -404,20 +1009,19 @@ def main():
                 if submitted:
                     base = round(distance * 1.5 + 3.0, 2)
                     total = round(base * surge, 2)
-                    next_id = db.rides.count_documents({}) + 1
                     new_ride = {
-                        "ride_id": f"RIDE{str(next_id).zfill(4)}",
                         "driver_id": driver, "rider_id": rider,
                         "pickup_location": {"address": pickup_addr,"lat": pickup_lat,"lng": pickup_lng},
                         "dropoff_location": {"address": dropoff_addr,"lat": dropoff_lat,"lng": dropoff_lng},
-                        "request_time": datetime.now().isoformat(),
+                        "request_time": ts(datetime.now()),
                         "start_time": None, "end_time": None,
                         "status": "pending","distance_km": distance,"duration_minutes": None,
                         "base_fare": base,"surge_multiplier": surge,"total_fare": total,
                         "payment_status": "pending","rating": None
                     }
                     try:
-                        db.rides.insert_one(new_ride)
+                        create_ride(db, get_ride_id_allocator(db, nonce), new_ride)
+                        invalidate_cache("rides")  # the shared snapshot catches up on its schedule; only reseeds force a reload
                         st.success(f"✅ Ride {new_ride['ride_id']} created successfully!")
                         st.balloons()
                         c1, c2, c3 = st.columns(3)
@@ -429,5 +1033,51 @@ def main():
         else:
             st.warning("⚠️ Initialize the database to load drivers and riders.")
 
+# ---------- Profiling (opt-in: ?profile=1 or RIDE_PROFILE=1) ----------
+# ?profile=1 times this rerun's sections (connect, sidebar/ping, each loader, each figure build and
+# st.plotly_chart) and counts its MongoDB commands; ?profile=cprofile or ?profile=pyinstrument also
+# writes a profile of the script thread to RIDE_PROFILE_DIR.
+PROFILE_DIR = os.environ.get("RIDE_PROFILE_DIR", "profiles")
+PROFILE_COLORS = {"load": "#667eea", "cache hit": "#a3bffa", "figure": "#f6ad55", "plotly_chart": "#ed8936"}
+
+def profile_mode():
+    # None when profiling is off, else the dump kind (None for overlay only).
+    value = (st.query_params.get("profile") or os.environ.get("RIDE_PROFILE") or "").lower()
+    if value in profiling.DUMPS:
+        return {"dump": value}
+    if value in ("1", "true", "yes", "on"):
+        dump = os.environ.get("RIDE_PROFILE_DUMP", "").lower()
+        return {"dump": dump if dump in profiling.DUMPS else None}
+    return None
+
+def profile_overlay(prof, dumped, kind):
+    rows = pd.DataFrame(prof.rows())
+    total_ms = rows["ms"].iloc[0]
+    with st.expander(f"⏱️ Profile (this rerun): {total_ms:.0f} ms · {prof.total_commands()} MongoDB command(s)"):
+        rows["label"] = ["\u2003" * d + n for d, n in zip(rows["depth"], rows["name"])]
+        rows["kind"], rows["row"] = rows["name"].str.split(" · ").str[0], range(len(rows))
+        fig = px.bar(rows, x="ms", base="start_ms", y="row", orientation="h", color="kind",
+                     color_discrete_map=PROFILE_COLORS, hover_data=["name", "ms", "commands", "thread"])
+        fig.update_yaxes(tickvals=list(rows["row"]), ticktext=list(rows["label"]), autorange="reversed", title=None)
+        fig.update_layout(xaxis_title="ms since rerun start", height=max(240, 24 * len(rows)), showlegend=False, bargap=0.15)
+        st.plotly_chart(fig, use_container_width=True)
+        rows["by_command"] = rows["by_command"].map(lambda c: ", ".join(f"{k}×{v}" for k, v in sorted(c.items())))
+        st.dataframe(rows[["label", "start_ms", "ms", "commands", "by_command", "thread"]].round(1), use_container_width=True, hide_index=True)
+        if dumped.get("path"):
+            st.caption(f"Profile written to {dumped['path']}")
+        elif kind == "pyinstrument":
+            st.caption("pyinstrument is not installed; pip install pyinstrument")
+
+def main():
+    metrics_exporter()
+    mode = profile_mode()
+    if mode is None:
+        render()
+        return
+    prof = profiling.Profiler()
+    with profiling.dump(mode["dump"], PROFILE_DIR) as dumped, prof.activate():
+        render()
+    profile_overlay(prof, dumped, mode["dump"])
+
 if __name__ == "__main__":
     main()
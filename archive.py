@@ -0,0 +1,81 @@
+# archive.py — optional Parquet archive of completed rides, one partition per request date
+# Closed days are exported once and decoded once per export; rides at or after the export
+# watermark, rides not yet completed and rides completed after it still come from MongoDB.
+#   <root>/date=2024-05-01/rides.parquet
+#   <root>/_manifest.json   {"watermark": "2024-05-03T00:00:00", "exported_at": ..., "partitions": {"2024-05-01": 1234, ...}}
+import contextlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: pip install pyarrow
+    pa = None
+
+MANIFEST = "_manifest.json"
+
+def available():
+    return pa is not None
+
+def partition_path(root, day):
+    return os.path.join(root, f"date={day:%Y-%m-%d}", "rides.parquet")
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        return {"watermark": None, "exported_at": None, "partitions": {}}
+    manifest["watermark"] = datetime.fromisoformat(manifest["watermark"]) if manifest["watermark"] else None
+    return manifest
+
+def write_manifest(root, watermark, partitions):
+    # Written last and swapped in atomically: readers only ever see fully written partitions.
+    tmp = os.path.join(root, MANIFEST + ".tmp")
+    with open(tmp, "w") as fh:
+        json.dump({"watermark": watermark.isoformat(), "exported_at": datetime.now().isoformat(), "partitions": partitions}, fh, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+def write_partition(root, day, frame):
+    path = partition_path(root, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def clear(root):
+    # Manifest first, so readers stop trusting the partitions before they disappear.
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(os.path.join(root, MANIFEST))
+    for name in os.listdir(root) if os.path.isdir(root) else []:
+        if name.startswith("date="):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+def tail_query(watermark):
+    # Everything the archive may not hold: newer rides, rides not (yet) completed, and older rides
+    # completed after the export. The last can overlap the archive (a ride that ended just after
+    # midnight of the cutoff day), so readers let the tail win on ride_id.
+    return {"$or": [{"request_time": {"$gte": watermark}}, {"status": {"$ne": "completed"}}, {"end_time": {"$gte": watermark}}]}
+
+
+class ArchiveReader:
+    # Decodes the archived partitions once per export; refreshes between exports reuse the frame.
+    def __init__(self, root):
+        self.root, self.lock, self.cached = root, threading.Lock(), None  # (exported_at, columns, frame)
+
+    def frame(self, columns=None, dtypes=None):
+        manifest = read_manifest(self.root)
+        with self.lock:
+            if self.cached and self.cached[:2] == (manifest["exported_at"], columns):
+                return manifest["watermark"], self.cached[2]
+            days = [day for day, rows in sorted(manifest["partitions"].items()) if rows]
+            tables = [pq.read_table(partition_path(self.root, datetime.fromisoformat(day)), columns=columns) for day in days]
+            frame = pa.concat_tables(tables, promote_options="permissive").to_pandas() if tables else pd.DataFrame(columns=columns)
+            frame = frame.astype({c: t for c, t in (dtypes or {}).items() if c in frame.columns})
+            self.cached = (manifest["exported_at"], columns, frame)
+            return manifest["watermark"], frame
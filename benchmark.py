@@ -0,0 +1,335 @@
+# benchmark.py — headless timing of app data paths against a seeded MongoDB
+#   python benchmark.py metrics --rides 1000000
+#   python benchmark.py map --rides 200000
+#   python benchmark.py ids --threads 16 --inserts 500
+#   python benchmark.py load --scales 100000,1000000
+#   python benchmark.py dtypes --rides 1000000
+#   python benchmark.py page --rides 1000000
+#   python benchmark.py pages --scales 10000,100000,1000000,5000000 --out bench_pages.json
+#   python benchmark.py pages --uri mongomock://bench --scales 10000   (in-process mock, e.g. for CI)
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pymongo
+from pymongo import MongoClient, monitoring
+
+import columnar
+import datagen
+import ride_repository
+
+BENCH_DB = "ride_bench"
+
+
+# ---------- Seeding ----------
+def seed(db, rides, reseed=False, batch_size=datagen.DEFAULT_BATCH_SIZE, writers=datagen.DEFAULT_WRITERS):
+    if not reseed and db.rides.estimated_document_count() == rides:
+        return
+    try:
+        stats = ride_repository.reseed(db, {"rides": rides}, batch_size, writers)
+    except Exception as e:
+        raise SystemExit(f"seeding failed: {e}")
+    for col, row in stats.items():
+        print(f"seeded {row['docs']:>10,} {col:<14} in {row['seconds']:6.1f}s  ({row['docs_per_sec']:,.0f} docs/sec)")
+
+
+# ---------- Benchmarks ----------
+def legacy_dashboard_metrics(db):
+    # The client-side implementation RideRepository.dashboard_metrics replaced; kept as the baseline.
+    total_rides = db.rides.count_documents({})
+    active_drivers = db.drivers.count_documents({"status": "available"})
+    completed_rides = list(db.rides.find({"status": "completed"}))
+    total_revenue = sum([ride.get('total_fare', 0) for ride in completed_rides])
+    rides_with_rating = list(db.rides.find({"rating": {"$ne": None}}))
+    avg_rating = round(sum([r['rating'] for r in rides_with_rating]) / len(rides_with_rating), 2) if rides_with_rating else 0
+    return {"total_rides": total_rides, "active_drivers": active_drivers, "total_revenue": total_revenue, "avg_rating": avg_rating}
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), result
+
+def bench_metrics(db, repeat):
+    for label, fn in [("legacy (client-side sum)", legacy_dashboard_metrics), ("aggregation ($facet/$group)", lambda db: ride_repository.RideRepository(db).dashboard_metrics())]:
+        median, result = timed(lambda: fn(db), repeat)
+        print(f"{label:<28} median {median * 1000:9.1f} ms  -> {result}")
+
+def legacy_map_points(rides):
+    # The per-row iterrows/try-except loop map_points replaced.
+    map_data = []
+    for _, ride in rides.iterrows():
+        for key in ["pickup_location", "dropoff_location"]:
+            try:
+                map_data.append({'lat': ride[key]['lat'], 'lon': ride[key]['lng']})
+            except Exception:
+                pass
+    return pd.DataFrame(map_data)
+
+def bench_map(rides, repeat):
+    # In-memory only: nested documents as the old loader produced them vs. server-flattened columns.
+    docs = datagen.rides_chunk(np.random.default_rng(0), 1, rides, drivers=12, riders=12)
+    nested = pd.DataFrame(docs, columns=['pickup_location', 'dropoff_location'])
+    flat = pd.json_normalize(docs)[[ride_repository.FLATTENED_FIELDS[c][1:] for c in ride_repository.PAGE_COLUMNS["map"]]].set_axis(ride_repository.PAGE_COLUMNS["map"], axis=1)
+    for label, fn, frame in [("legacy (iterrows)", legacy_map_points, nested), ("vectorized (map_points)", ride_repository.map_points, flat)]:
+        median, points = timed(lambda: fn(frame), repeat)
+        print(f"{label:<28} median {median * 1000:9.1f} ms  {median / rides * 1e6:8.3f} µs/ride  -> {len(points):,} points")
+
+def flat_rides(rides):
+    # Generated ride documents shaped like the loaders' flattened projection, no DB needed.
+    for doc in datagen.rides_chunk(np.random.default_rng(0), 1, rides, drivers=5000, riders=200_000):
+        for end in ("pickup", "dropoff"):
+            location = doc.pop(f"{end}_location")
+            doc[f"{end}_address"], doc[f"{end}_lat"], doc[f"{end}_lng"] = location["address"], location["lat"], location["lng"]
+        yield doc
+
+def bench_dtypes(rides):
+    loaded = columnar.frame_from_cursor(flat_rides(rides), ride_repository.RIDES_SCHEMA)
+    report = columnar.memory_report(loaded, columnar.compact(loaded, ride_repository.RIDES_DTYPES))
+    print(report.to_string(float_format=lambda v: f"{v:,.2f}"))
+    total = report.loc["total"]
+    print(f"{rides:,} rides: {total['mb_before']:,.1f} MB -> {total['mb_after']:,.1f} MB ({total['saved']:.0%} smaller)")
+
+def stress_ride_ids(db, threads, inserts):
+    # Concurrent Add New Ride submissions: half the workers share one allocator (sessions in
+    # one process), half get their own (separate processes). Every ride_id must be unique, and
+    # the only ids skipped are the unused tails of each allocator's last block.
+    db.rides.drop()
+    db.counters.drop()
+    ride_repository.ensure_indexes(db)
+    shared = ride_repository.IdAllocator(db, "ride_id")
+    start = threading.Barrier(threads)
+    def worker(n):
+        allocator = shared if n % 2 == 0 else ride_repository.IdAllocator(db, "ride_id")
+        start.wait()
+        return [ride_repository.create_ride(db, allocator, {"status": "pending", "request_time": ride_repository.ts(datetime.now())})["ride_id"] for _ in range(inserts)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        ids = [ride_id for batch in pool.map(worker, range(threads)) for ride_id in batch]
+    seconds = time.perf_counter() - t0
+    unique, stored = len(set(ids)), db.rides.count_documents({})
+    allocators, reserved = 1 + threads // 2, db.counters.find_one({"_id": "ride_id"})["seq"]
+    skipped, allowed = reserved - unique, allocators * (ride_repository.RIDE_ID_BLOCK - 1)
+    print(f"{len(ids):,} rides from {threads} threads in {seconds:.2f}s ({len(ids) / seconds:,.0f}/s): {unique:,} unique ids, {stored:,} stored, "
+          f"{skipped:,} of {reserved:,} reserved ids skipped (at most {allowed:,} from {allocators} allocators)")
+    if unique != len(ids) or stored != len(ids):
+        raise SystemExit("duplicate or lost ride ids")
+    if skipped > allowed or max(int(ride_id[4:]) for ride_id in ids) > reserved:
+        raise SystemExit("gap in ride ids beyond unused block tails")
+
+def dashboard_reads(repo):
+    # The Dashboard's independent reads, as the page issues them on a cold cache.
+    return {"metrics": repo.dashboard_metrics, "rides": lambda: repo.rides(ride_repository.PAGE_COLUMNS["dashboard"]),
+            "drivers": repo.drivers, "revenue": repo.revenue_trend}
+
+async def timed_async(make, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await make()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+async def bench_page_async(args):
+    repo = ride_repository.AsyncRideRepository(ride_repository.connect_async({**ride_repository.MONGO_CONFIG, "uri": args.uri, "database": args.db}))
+    reads = lambda: asyncio.gather(repo.dashboard_metrics(), repo.rides(ride_repository.PAGE_COLUMNS["dashboard"]), repo.drivers(), repo.revenue_trend())
+    try:
+        return await timed_async(reads, args.repeat)
+    finally:
+        await repo.db.client.close()
+
+def bench_page(db, args):
+    # Page latency with the reads run one after another vs. together; concurrent should be
+    # close to the slowest single read rather than their sum.
+    reads = dashboard_reads(ride_repository.RideRepository(db))
+    single = {name: timed(fn, args.repeat)[0] for name, fn in reads.items()}
+    print("  ".join(f"{name} {s * 1000:.1f} ms" for name, s in single.items()) + f"  | sum {sum(single.values()) * 1000:.1f} ms, slowest {max(single.values()) * 1000:.1f} ms")
+    results = {"sequential": timed(lambda: [fn() for fn in reads.values()], args.repeat)[0]}
+    with ThreadPoolExecutor(len(reads)) as pool:
+        results["thread pool"] = timed(lambda: list(pool.map(lambda fn: fn(), reads.values())), args.repeat)[0]
+    if ride_repository.AsyncMongoClient is not None:
+        results["asyncio"] = asyncio.run(bench_page_async(args))
+    for label, seconds in results.items():
+        print(f"{label:<12} median {seconds * 1000:9.1f} ms  ({seconds / max(single.values()):.2f}x slowest read)")
+
+# Each loader runs in a fresh interpreter so ru_maxrss is that loader's own peak.
+LOADERS = {
+    "dicts": lambda db: pd.DataFrame(list(db.rides.find({}, ride_repository.ride_projection(None)))),  # the list-of-dicts path the loaders replaced
+    "numpy": lambda db: columnar.frame_from_cursor(db.rides.find({}, ride_repository.ride_projection(None)), ride_repository.RIDES_SCHEMA),
+    "arrow": lambda db: columnar.find_frame(db.rides, {}, ride_repository.ride_projection(None), ride_repository.RIDES_SCHEMA),
+}
+
+def load_worker(db, loader):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    df = LOADERS[loader](db)
+    seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+    compact_mb = columnar.compact(df, ride_repository.RIDES_DTYPES).memory_usage(deep=True).sum() / 2**20
+    print(json.dumps({"rows": len(df), "seconds": seconds, "peak_mb": peak / 1024, "delta_mb": (peak - baseline) / 1024, "frame_mb": df.memory_usage(deep=True).sum() / 2**20, "compact_mb": compact_mb}))
+
+def bench_load(db, args):
+    loaders = [name for name in LOADERS if name != "arrow" or columnar.arrow_available()]
+    for rides in [int(s) for s in (args.scales or "100000,1000000").split(",")]:
+        seed(db, rides, args.reseed, args.batch_size, args.writers)
+        for loader in loaders:
+            out = subprocess.run([sys.executable, __file__, "load-worker", "--loader", loader, "--uri", args.uri, "--db", args.db], capture_output=True, text=True, check=True)
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{rides:>9,} rides  {loader:<6} {row['seconds']:7.2f}s  peak RSS {row['peak_mb']:8.1f} MB (+{row['delta_mb']:.1f})  frame {row['frame_mb']:8.1f} MB -> {row['compact_mb']:.1f} MB compact")
+
+
+# ---------- Page suite (headless AppTest runs) ----------
+# Each (scale, page) runs in a fresh interpreter: the app script is executed by Streamlit's
+# AppTest with that page preselected, once cold (new process: connect, snapshot loads, empty
+# session cache) and once warm (a rerun of the same session). Round trips come from a global
+# pymongo command listener; bytes are the server's serverStatus network counters, so they are
+# wire sizes and include background snapshot loads. mongomock reports neither. A page that
+# raises or shows st.error is a failure: its timings would be of the fallback path.
+PAGE_SCALES = "10000,100000,1000000,5000000"
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = self.failures = 0
+    def started(self, event): pass
+    def succeeded(self, event): self.count += 1
+    def failed(self, event):
+        self.count += 1
+        self.failures += 1
+
+def network_bytes(client):
+    if client is None:
+        return None
+    network = client.admin.command("serverStatus")["network"]
+    return network["bytesIn"], network["bytesOut"]
+
+SURGE_ALERT = re.compile(r"^(🔴 )?.+: [\d.]+x \| \d+ requests \| \d+ drivers$")  # the Surge page's high-demand zones use st.error on purpose (Streamlit lifts the emoji into the icon)
+
+def page_errors(at):
+    # st.error messages of the last AppTest run that report a failure.
+    return [e.value[:200] for e in at.error if not SURGE_ALERT.match(e.value)]
+
+def page_worker(args):
+    from streamlit.testing.v1 import AppTest
+    mock = args.uri.startswith(ride_repository.MOCK_SCHEME)
+    stats_client = None if mock else MongoClient(args.uri)  # created before the listener, so its serverStatus calls are not counted
+    if mock:
+        db = ride_repository.mongo_client(args.uri)[args.db]  # the same in-process client the app will get
+        datagen.seed_database(db, {"rides": args.rides}, batch_size=args.batch_size, writers=1, ts=ride_repository.ts)
+    counter = CommandCounter()
+    monitoring.register(counter)  # applies to every client created from here on, i.e. the app's
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    at.session_state["_page"] = args.page
+    row = {"rss_before_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    for phase in ("cold", "warm"):
+        commands, net = counter.count, network_bytes(stats_client)
+        t0 = time.perf_counter()
+        at.run()
+        wall = time.perf_counter() - t0
+        after = network_bytes(stats_client)
+        row[phase] = {
+            "wall_s": round(wall, 4), "round_trips": None if mock else counter.count - commands,
+            "bytes_in": after[0] - net[0] if net else None, "bytes_out": after[1] - net[1] if net else None,
+            "exceptions": [str(e.value) for e in at.exception], "errors": page_errors(at),
+        }
+    row["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    print(json.dumps(row))
+
+def git_commit():
+    out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(APP_PATH))
+    return out.stdout.strip() or None
+
+def bench_pages(args):
+    mock = args.uri.startswith(ride_repository.MOCK_SCHEME)
+    pages = args.pages.split(",") if args.pages else ride_repository.PAGES
+    report = {"meta": {"commit": git_commit(), "created": datetime.now().isoformat(timespec="seconds"), "backend": "mongomock" if mock else "mongod",
+                       "python": sys.version.split()[0], "pymongo": pymongo.version, "pandas": pd.__version__}, "results": {}}
+    # Long snapshot intervals keep background reloads out of the measurements.
+    env = {**os.environ, "RIDE_MONGO_URI": args.uri, "RIDE_MONGO_DB": args.db, "RIDE_SNAPSHOT_SECONDS": "86400"}
+    failures = 0
+    for rides in [int(s) for s in (args.scales or PAGE_SCALES).split(",")]:
+        if not mock:
+            seed(MongoClient(args.uri)[args.db], rides, args.reseed, args.batch_size, args.writers)
+        results = report["results"][str(rides)] = {}
+        for page in pages:
+            out = subprocess.run([sys.executable, __file__, "pages-worker", "--page", page, "--rides", str(rides), "--uri", args.uri, "--db", args.db,
+                                  "--batch-size", str(args.batch_size), "--timeout", str(args.timeout)], capture_output=True, text=True, env=env)
+            if out.returncode:
+                results[page] = {"failed": out.stderr.strip().splitlines()[-1:]}
+                failures += 1
+                print(f"{rides:>9,} rides  {page:<10} FAILED {results[page]['failed']}")
+                continue
+            row = results[page] = json.loads(out.stdout.strip().splitlines()[-1])
+            cold, warm = row["cold"], row["warm"]
+            problems = cold["exceptions"] + cold["errors"] + warm["exceptions"] + warm["errors"]
+            row["failed"], failures = problems, failures + bool(problems)
+            trips = f"{cold['round_trips']:>4} / {warm['round_trips']:<4} trips" if cold["round_trips"] is not None else ""
+            size = f"{(cold['bytes_out'] or 0) / 2**20:8.1f} MB out" if cold["bytes_out"] is not None else ""
+            print(f"{rides:>9,} rides  {page:<10} cold {cold['wall_s']:7.2f}s  warm {warm['wall_s']:7.2f}s  {trips}  {size}  peak RSS {row['peak_rss_mb']:8.1f} MB" + (f"  FAILED {problems[:1]}" if problems else ""))
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=1, sort_keys=True)
+    print(f"report written to {args.out}")
+    if failures:
+        print(f"{failures} page run(s) failed")
+        return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Ride-Sharing Intelligence data paths.")
+    parser.add_argument("target", choices=["metrics", "map", "ids", "load", "load-worker", "dtypes", "page", "pages", "pages-worker"])
+    parser.add_argument("--uri", default=ride_repository.mongo_uri())
+    parser.add_argument("--db", default=BENCH_DB)
+    parser.add_argument("--rides", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reseed", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=datagen.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--writers", type=int, default=datagen.DEFAULT_WRITERS)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--inserts", type=int, default=500, help="rides per thread for the ids stress test")
+    parser.add_argument("--scales", help=f"ride counts for the load (default 100000,1000000) and pages (default {PAGE_SCALES}) benchmarks")
+    parser.add_argument("--loader", choices=list(LOADERS), default="numpy")
+    parser.add_argument("--pages", help=f"comma-separated subset of {','.join(ride_repository.PAGES)}")
+    parser.add_argument("--page", choices=ride_repository.PAGES, default="dashboard", help=argparse.SUPPRESS)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds allowed per AppTest run")
+    parser.add_argument("--out", default="bench_pages.json", help="JSON report for the pages benchmark")
+    args = parser.parse_args()
+
+    if args.target == "map":
+        return bench_map(args.rides, args.repeat)
+    if args.target == "dtypes":
+        return bench_dtypes(args.rides)
+    if args.target == "pages":
+        return bench_pages(args)
+    if args.target == "pages-worker":
+        return page_worker(args)
+    db = MongoClient(args.uri)[args.db]
+    if args.target == "load-worker":
+        return load_worker(db, args.loader)
+    if args.target == "load":
+        return bench_load(db, args)
+    if args.target == "ids":
+        return stress_ride_ids(db.client[f"{args.db}_ids"], args.threads, args.inserts)
+    seed(db, args.rides, args.reseed, args.batch_size, args.writers)
+    ride_repository.ensure_indexes(db)
+    if args.target == "metrics":
+        bench_metrics(db, args.repeat)
+    if args.target == "page":
+        bench_page(db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
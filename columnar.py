@@ -0,0 +1,99 @@
+# columnar.py — cursor -> DataFrame materialization against an explicit column schema
+# With pymongoarrow installed, results are decoded straight into Arrow tables. Otherwise
+# documents are consumed a chunk at a time and packed into NumPy columns, so a full list of
+# per-document dicts is never held alongside the frame.
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pymongoarrow.api import Schema, find_arrow_all
+except ImportError:  # optional: pip install pymongoarrow
+    pa = None
+
+CHUNK_ROWS = 50_000
+
+def arrow_available():
+    return pa is not None
+
+def arrow_schema(schema):
+    types = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64(), "datetime": pa.timestamp("ms")}
+    return Schema({name: types[kind] for name, kind in schema.items()})
+
+
+# ---------- NumPy fallback ----------
+def _chunk(values, kind):
+    if kind in ("float64", "int64"):
+        return np.array(values, dtype="float64")  # None -> NaN; integers narrowed in _finish
+    if kind == "datetime":
+        try:
+            return np.array(values, dtype="datetime64[ms]")  # datetime or None -> NaT
+        except ValueError:
+            return pd.to_datetime(pd.Series(values, dtype=object)).to_numpy("datetime64[ms]")  # legacy ISO strings
+    return np.array(values, dtype=object)
+
+def _finish(column, kind):
+    if kind == "int64" and not np.isnan(column).any():
+        return column.astype("int64")
+    return column
+
+class ColumnBuilder:
+    # Buffers one chunk of documents per column and packs it into NumPy arrays when full.
+    def __init__(self, schema, chunk_rows=CHUNK_ROWS):
+        self.schema, self.chunk_rows, self.rows = schema, chunk_rows, 0
+        self.buffers, self.chunks = {n: [] for n in schema}, {n: [] for n in schema}
+
+    def _flush(self):
+        for n, kind in self.schema.items():
+            self.chunks[n].append(_chunk(self.buffers[n], kind))
+            self.buffers[n].clear()
+
+    def add(self, doc):
+        for n, values in self.buffers.items():
+            values.append(doc.get(n))
+        self.rows += 1
+        if self.rows % self.chunk_rows == 0:
+            self._flush()
+
+    def frame(self):
+        if self.rows % self.chunk_rows or not self.rows:
+            self._flush()
+        return pd.DataFrame({n: _finish(np.concatenate(self.chunks[n]), kind) for n, kind in self.schema.items()})
+
+def frame_from_cursor(cursor, schema, chunk_rows=CHUNK_ROWS):
+    builder = ColumnBuilder(schema, chunk_rows)
+    for doc in cursor:
+        builder.add(doc)
+    return builder.frame()
+
+async def frame_from_async_cursor(cursor, schema, chunk_rows=CHUNK_ROWS):
+    # Same packing for pymongo async / motor cursors.
+    builder = ColumnBuilder(schema, chunk_rows)
+    async for doc in cursor:
+        builder.add(doc)
+    return builder.frame()
+
+
+# ---------- Compact dtypes ----------
+def compact(df, dtypes):
+    # Casts to the declared compact dtypes; columns not listed keep their loaded dtype.
+    return df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+def memory_report(before, after):
+    # Per-column deep memory of a frame before and after compact(), plus a total row.
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str), "mb_before": before.memory_usage(deep=True, index=False) / 2**20,
+        "dtype_after": after.dtypes.astype(str), "mb_after": after.memory_usage(deep=True, index=False) / 2**20,
+    })
+    report.loc["total"] = ["", report["mb_before"].sum(), "", report["mb_after"].sum()]
+    report["saved"] = 1 - report["mb_after"] / report["mb_before"]
+    return report
+
+
+def find_frame(collection, query, projection, schema, sort=None, limit=0, use_arrow=True):
+    # `projection` must yield top-level fields named as in `schema` (flatten nested ones server-side).
+    if use_arrow and arrow_available():
+        table = find_arrow_all(collection, query, schema=arrow_schema(schema), projection=projection, sort=sort, limit=limit)
+        return table.to_pandas()
+    cursor = collection.find(query, projection, limit=limit)
+    return frame_from_cursor(cursor.sort(sort) if sort else cursor, schema)
@@ -0,0 +1,168 @@
+# datagen.py — vectorized synthetic data for seeding and load-testing the dashboard
+# Columns are sampled with NumPy a chunk at a time and written with unordered insert_many
+# batches from a pool of writer threads, so millions of rides seed in bounded memory.
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+
+DEMO_SCALE = {"drivers": 12, "riders": 12, "rides": 15, "zones": 12}
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_WRITERS = 4
+
+DRIVER_NAMES = ['John Smith','Emma Johnson','Michael Brown','Sarah Davis','David Wilson','Lisa Anderson','James Taylor','Maria Garcia','Robert Martinez','Jennifer Lopez','William Clark','Patricia White']
+RIDER_NAMES = ['Alice Cooper','Bob Martin','Charlie Evans','Diana Prince','Edward Norton','Fiona Apple','George Lucas','Hannah Montana','Ian McKellen','Julia Roberts','Kevin Hart','Laura Palmer']
+VEHICLE_MODELS = [('Toyota','Camry',2021),('Honda','Civic',2022),('Ford','Fusion',2020),('Chevrolet','Malibu',2021),('Nissan','Altima',2022),('Hyundai','Sonata',2021),('Kia','Optima',2020),('Mazda','Mazda6',2021),('Volkswagen','Passat',2022),('Subaru','Legacy',2021),('Tesla','Model 3',2023),('BMW','3 Series',2022)]
+COLORS = ['Black','White','Silver','Blue','Red','Gray','Green','Brown']
+PAYMENT_METHODS = ['Credit Card','PayPal','Apple Pay','Google Pay']
+RIDE_STATUSES = ['completed','in_progress','cancelled','pending']
+DRIVER_STATUSES = ['available','busy','offline']
+DEMAND_LEVELS = ['low','medium','high','very_high']
+STREET_NAMES = ['Main','Oak','Pine','Maple','Broadway','Park','Market','First','Second','Third']
+ZONE_TYPES = ['Downtown','Uptown','Midtown','Airport','Business District','Suburb','Mall Area','Train Station','University','Beach Area']
+ZONE_SIDES = ['North','South','East','West','Central']
+LAT_RANGE, LNG_RANGE = (40.7, 40.8), (-74.0, -73.9)
+RIDE_HISTORY_HOURS = 72
+
+
+# ---------- Column helpers ----------
+def ids(prefix, start, n, width):
+    return np.char.add(prefix, np.char.zfill(np.arange(start, start + n).astype(str), width)).tolist()
+
+def random_ids(rng, prefix, upper, n, width):
+    # References to existing entities, e.g. a ride's driver_id drawn from DRV001..DRV{upper}.
+    return np.char.add(prefix, np.char.zfill(rng.integers(1, upper + 1, n).astype(str), width)).tolist()
+
+def names(rng, pool, start, n):
+    # The curated demo names first, then first/last combinations drawn from them.
+    first, last = [p.split()[0] for p in pool], [p.split()[1] for p in pool]
+    combos = np.char.add(np.char.add(rng.choice(first, n), " "), rng.choice(last, n)).tolist()
+    return [pool[i] if i < len(pool) else combos[k] for k, i in enumerate(range(start, start + n))]
+
+def phones(rng, n):
+    return np.char.add("+1-555-", rng.integers(1000, 10000, n).astype(str)).tolist()
+
+def uniform(rng, lo, hi, n, decimals):
+    return np.round(rng.uniform(lo, hi, n), decimals).tolist()
+
+def timestamps(now, minutes_ago, ts):
+    moments = (np.datetime64(now, 'us') - minutes_ago.astype('timedelta64[m]')).astype('datetime64[us]').tolist()
+    return [ts(m) for m in moments]
+
+
+# ---------- Chunk generators (each returns a list of documents) ----------
+def drivers_chunk(rng, start, n, ts=None):
+    statuses = rng.choice(DRIVER_STATUSES, n).tolist()
+    return [
+        {"driver_id": d, "name": name, "phone": phone, "rating": rating, "total_rides": total, "status": status,
+         "location": {"lat": lat, "lng": lng}, "earnings_today": earnings, "vehicle_id": v}
+        for d, name, phone, rating, total, status, lat, lng, earnings, v in zip(
+            ids("DRV", start, n, 3), names(rng, DRIVER_NAMES, start - 1, n), phones(rng, n), uniform(rng, 4.0, 5.0, n, 2),
+            rng.integers(50, 501, n).tolist(), statuses, uniform(rng, *LAT_RANGE, n, 4), uniform(rng, *LNG_RANGE, n, 4),
+            uniform(rng, 50, 300, n, 2), ids("VEH", start, n, 3))
+    ]
+
+def riders_chunk(rng, start, n, ts=None):
+    return [
+        {"rider_id": r, "name": name, "phone": phone, "rating": rating, "total_rides": total, "payment_method": method, "wallet_balance": wallet}
+        for r, name, phone, rating, total, method, wallet in zip(
+            ids("RDR", start, n, 3), names(rng, RIDER_NAMES, start - 1, n), phones(rng, n), uniform(rng, 4.0, 5.0, n, 2),
+            rng.integers(10, 201, n).tolist(), rng.choice(PAYMENT_METHODS, n).tolist(), uniform(rng, 0, 100, n, 2))
+    ]
+
+def vehicles_chunk(rng, start, n, ts=None):
+    models = rng.integers(0, len(VEHICLE_MODELS), n).tolist()
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))[rng.integers(0, 26, (n, 2))]
+    plates = np.char.add(np.char.add(letters[:, 0], letters[:, 1]), rng.integers(1000, 10000, n).astype(str)).tolist()
+    return [
+        {"vehicle_id": v, "make": VEHICLE_MODELS[m][0], "model": VEHICLE_MODELS[m][1], "year": VEHICLE_MODELS[m][2],
+         "license_plate": plate, "color": color, "capacity": capacity}
+        for v, m, plate, color, capacity in zip(ids("VEH", start, n, 3), models, plates, rng.choice(COLORS, n).tolist(), rng.choice([4, 6, 8], n).tolist())
+    ]
+
+def rides_chunk(rng, start, n, drivers, riders, ts=None, now=None):
+    ts, now = ts or (lambda value: value), now or datetime.now()
+    requested = rng.integers(0, RIDE_HISTORY_HOURS + 1, n) * 60
+    duration = rng.integers(10, 61, n)
+    distance = np.round(rng.uniform(2, 25, n), 2)
+    base_fare = np.round(distance * 1.5 + rng.uniform(2, 5, n), 2)
+    surge = np.round(rng.uniform(1.0, 2.5, n), 1)
+    status = rng.choice(RIDE_STATUSES, n)
+    completed = status == 'completed'
+    rating = np.where(completed, np.round(rng.uniform(3.5, 5.0, n), 1), np.nan)
+    return [
+        {"ride_id": ride_id, "driver_id": driver_id, "rider_id": rider_id,
+         "pickup_location": {"address": f"{p_no} {p_st} St", "lat": p_lat, "lng": p_lng},
+         "dropoff_location": {"address": f"{d_no} {d_st} Ave", "lat": d_lat, "lng": d_lng},
+         "request_time": req, "start_time": begin, "end_time": end, "status": st,
+         "distance_km": dist, "duration_minutes": dur, "base_fare": base, "surge_multiplier": mult,
+         "total_fare": total, "payment_status": 'paid' if st == 'completed' else 'pending',
+         "rating": None if r != r else r}
+        for ride_id, driver_id, rider_id, p_no, p_st, p_lat, p_lng, d_no, d_st, d_lat, d_lng, req, begin, end, st, dist, dur, base, mult, total, r in zip(
+            ids("RIDE", start, n, 4), random_ids(rng, "DRV", drivers, n, 3), random_ids(rng, "RDR", riders, n, 3),
+            rng.integers(100, 1000, n).tolist(), rng.choice(STREET_NAMES, n).tolist(), uniform(rng, *LAT_RANGE, n, 4), uniform(rng, *LNG_RANGE, n, 4),
+            rng.integers(100, 1000, n).tolist(), rng.choice(STREET_NAMES, n).tolist(), uniform(rng, *LAT_RANGE, n, 4), uniform(rng, *LNG_RANGE, n, 4),
+            timestamps(now, requested, ts), timestamps(now, requested - rng.integers(2, 9, n), ts), timestamps(now, requested - duration, ts),
+            status.tolist(), distance.tolist(), duration.tolist(), base_fare.tolist(), surge.tolist(), np.round(base_fare * surge, 2).tolist(), rating.tolist())
+    ]
+
+def zones_chunk(rng, start, n, ts=None):
+    ts = ts or (lambda value: value)
+    zone_names = np.char.add(np.char.add(rng.choice(ZONE_TYPES, n), " "), rng.choice(ZONE_SIDES, n)).tolist()
+    return [
+        {"zone_id": z, "zone_name": name, "current_surge": surge, "demand_level": demand, "available_drivers": available,
+         "active_requests": active, "timestamp": ts(datetime.now()), "avg_wait_time": wait_time}
+        for z, name, surge, demand, available, active, wait_time in zip(
+            ids("ZONE", start, n, 2), zone_names, uniform(rng, 1.0, 2.8, n, 1), rng.choice(DEMAND_LEVELS, n).tolist(),
+            rng.integers(2, 26, n).tolist(), rng.integers(0, 41, n).tolist(), rng.integers(2, 16, n).tolist())
+    ]
+
+
+# ---------- Bulk writer ----------
+def chunks(make, total, batch_size):
+    for lo in range(0, total, batch_size):
+        yield make(lo + 1, min(batch_size, total - lo))
+
+def bulk_insert(collection, batches, writers=DEFAULT_WRITERS, on_progress=None, label=None):
+    # Generation runs on the calling thread while up to 2 x writers batches are in flight.
+    # on_progress(label, docs written so far) fires as batches complete.
+    written, started = 0, time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers, thread_name_prefix=f"seed-{collection.name}") as pool:
+        pending = set()
+        def drain(block):
+            nonlocal written, pending
+            done, pending = wait(pending, return_when=FIRST_COMPLETED if block else ALL_COMPLETED)
+            for future in done:
+                written += future.result()
+            if on_progress:
+                on_progress(label or collection.name, written)
+        for docs in batches:
+            if len(pending) >= writers * 2:
+                drain(True)
+            pending.add(pool.submit(lambda d: len(collection.insert_many(d, ordered=False).inserted_ids), docs))
+        drain(False)
+    seconds = time.perf_counter() - started
+    return {"docs": written, "seconds": seconds, "docs_per_sec": written / seconds if seconds else 0.0}
+
+def collection_totals(scale=None):
+    scale = {**DEMO_SCALE, **(scale or {})}
+    return {"drivers": scale["drivers"], "riders": scale["riders"], "vehicles": scale["drivers"], "rides": scale["rides"], "surge_pricing": scale["zones"]}
+
+def seed_database(db, scale=None, batch_size=DEFAULT_BATCH_SIZE, writers=DEFAULT_WRITERS, ts=None, seed=None, on_progress=None, names=None):
+    # `names` maps a collection to the physical collection to write, e.g. a staging copy.
+    names = names or {}
+    scale = {**DEMO_SCALE, **(scale or {})}
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    makers = {
+        "drivers": lambda start, n: drivers_chunk(rng, start, n, ts),
+        "riders": lambda start, n: riders_chunk(rng, start, n, ts),
+        "vehicles": lambda start, n: vehicles_chunk(rng, start, n, ts),
+        "rides": lambda start, n: rides_chunk(rng, start, n, scale["drivers"], scale["riders"], ts, now),
+        "surge_pricing": lambda start, n: zones_chunk(rng, start, n, ts),
+    }
+    return {
+        name: bulk_insert(db[names.get(name, name)], chunks(makers[name], total, batch_size), writers, on_progress, label=name)
+        for name, total in collection_totals(scale).items()
+    }
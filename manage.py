@@ -0,0 +1,259 @@
+# manage.py — maintenance commands for the ride_demo database
+#   python manage.py ensure-indexes
+#   python manage.py explain
+#   python manage.py migrate-timestamps
+#   python manage.py rebuild-rollup     (revenue rollup and trendline sums)
+#   RIDE_ARCHIVE_DIR=./ride_archive python manage.py export-archive
+#   python manage.py seed --rides 1000000 --drivers 5000 --riders 200000 --writers 8
+#   python manage.py replset --port 27117 --members 2   (needs mongod on PATH)
+#   python manage.py check-metrics --metrics-url http://127.0.0.1:9464/metrics   (omit the URL to render every page headless in-process)
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from pymongo import MongoClient, WriteConcern, monitoring
+from pymongo.errors import PyMongoError
+
+import archive
+import datagen
+import ride_repository
+import telemetry
+
+
+def cmd_ensure_indexes(db, args):
+    failed = False
+    for row in ride_repository.ensure_indexes(db):
+        status = f"FAILED: {row['error']}" if row["error"] else "ok"
+        failed |= bool(row["error"])
+        print(f"{row['collection']:<14} {row['index']:<34} {status:<6}  serves: {row['serves']}")
+    return 1 if failed else 0
+
+def cmd_explain(db, args):
+    collscans = 0
+    for row in ride_repository.explain_query_shapes(db):
+        collscans += row["collscan"]
+        flag = "COLLSCAN" if row["collscan"] else "ok"
+        print(f"{flag:<8} {row['collection']:<14} {row['page']:<45} {', '.join(row['stages'])}")
+    print(f"{collscans} query shape(s) with a collection scan")
+    return 1 if collscans else 0
+
+def cmd_migrate_timestamps(db, args):
+    for col, modified in ride_repository.migrate_timestamps(db).items():
+        print(f"{col:<14} {modified} document(s) converted to BSON dates")
+    return 0
+
+def cmd_rebuild_rollup(db, args):
+    ride_repository.rebuild_revenue_rollup(db)
+    for unit in ride_repository.ROLLUP_UNITS:
+        print(f"{unit:<5} {db.revenue_rollup.count_documents({'granularity': unit})} bucket(s)")
+    ride_repository.rebuild_trend_stats(db)
+    for model in ride_repository.TREND_MODELS:
+        fit = ride_repository.trend_fit(db.trend_stats.find_one({"_id": model}))
+        print(f"{model:<18} " + (f"y = {fit['intercept']:.3f} + {fit['slope']:.4f}x  (n={fit['n']:,})" if fit else "no data"))
+    return 0
+
+def cmd_export_archive(db, args):
+    if not ride_repository.archive_enabled():
+        print("archive disabled: set RIDE_ARCHIVE_DIR, install pyarrow, and use native timestamps")
+        return 1
+    exported = ride_repository.export_archive(db)
+    for day, rows in exported.items():
+        print(f"{day}  {rows:>10,} completed ride(s)")
+    print(f"{len(exported)} day(s) exported; watermark {archive.read_manifest(ride_repository.ARCHIVE_DIR)['watermark']}")
+    return 0
+
+def cmd_seed(db, args):
+    scale = {"rides": args.rides, "drivers": args.drivers, "riders": args.riders, "zones": args.zones}
+    try:
+        stats = ride_repository.reseed(db, scale, args.batch_size, args.writers, args.reset)
+    except Exception as e:
+        print(f"Database Initialization Error: {e}")
+        return 1
+    for col, row in stats.items():
+        print(f"{col:<14} {row['docs']:>10,} docs in {row['seconds']:7.1f}s  ({row['docs_per_sec']:,.0f} docs/sec)")
+    return 0
+
+# ---------- Local replica set ----------
+@contextlib.contextmanager
+def local_replica_set(port=27117, members=2, name="rs0", mongod="mongod"):
+    # Throwaway replica set in a temp dir: one primary plus priority-0 secondaries, so routed
+    # reads always have a secondary to land on. Yields a URI; the set is torn down on exit.
+    if not shutil.which(mongod):
+        raise SystemExit(f"{mongod} not found on PATH")
+    root, procs = tempfile.mkdtemp(prefix="ride-rs-"), []
+    try:
+        for n in range(members):
+            path = f"{root}/n{n}"
+            os.makedirs(path)
+            procs.append(subprocess.Popen([mongod, "--replSet", name, "--port", str(port + n), "--dbpath", path, "--bind_ip", "127.0.0.1"],
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT))
+        seed = MongoClient(f"mongodb://127.0.0.1:{port}", directConnection=True, serverSelectionTimeoutMS=30_000)
+        seed.admin.command("ping")
+        seed.admin.command("replSetInitiate", {"_id": name, "members": [
+            {"_id": n, "host": f"127.0.0.1:{port + n}", "priority": 1 if n == 0 else 0} for n in range(members)]})
+        for _ in range(120):
+            state = seed.admin.command("replSetGetStatus")
+            if sum(m["stateStr"] in ("PRIMARY", "SECONDARY") for m in state["members"]) == members:
+                break
+            time.sleep(0.5)
+        else:
+            raise SystemExit("replica set did not come up")
+        seed.close()
+        yield f"mongodb://127.0.0.1:{port}/?replicaSet={name}"
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=30)
+        shutil.rmtree(root, ignore_errors=True)
+
+class ServerRecorder(monitoring.CommandListener):
+    def __init__(self):
+        self.servers = {}  # command name -> set of "host:port"
+    def started(self, event):
+        self.servers.setdefault(event.command_name, set()).add("%s:%s" % event.connection_id)
+    def succeeded(self, event): pass
+    def failed(self, event): pass
+
+def routing(uri, db_name):
+    # One write and one read per page against `uri`; returns a row per operation with the member(s)
+    # that served it, the member(s) the configured read preference allows, and whether they match.
+    # The probe document is removed and the client closed even if a read fails.
+    recorder = ServerRecorder()
+    client = MongoClient(uri, event_listeners=[recorder], serverSelectionTimeoutMS=10_000)
+    db = client[db_name]
+    try:
+        db.get_collection("rides", write_concern=WriteConcern(w="majority")).insert_one({"ride_id": "RIDE-ROUTING-CHECK", "status": "pending"})
+        primary = "%s:%s" % client.primary
+        served = recorder.servers.get("insert", set())
+        rows = [{"page": "write", "mode": "primary", "command": "insert", "served": served, "expected": {primary}, "ok": served == {primary}}]
+        for page in ride_repository.PAGES:
+            recorder.servers.pop("find", None)
+            ride_repository.page_db(db, page).rides.find_one({"ride_id": "RIDE-ROUTING-CHECK"})
+            mode, served = ride_repository.MONGO_CONFIG["read_preference"].get(page, "primary"), recorder.servers.get("find", set())
+            expected = {"primary": {primary}, "secondary": served - {primary}, "secondaryPreferred": served - {primary}}.get(mode, served)
+            rows.append({"page": page, "mode": mode, "command": "find", "served": served, "expected": expected, "ok": served == expected and bool(served)})
+        return rows
+    finally:
+        with contextlib.suppress(PyMongoError):  # best effort, so it never masks the error that got here
+            db.rides.delete_many({"ride_id": "RIDE-ROUTING-CHECK"})
+        client.close()
+
+def check_routing(uri, db_name):
+    # Prints routing() as a table; True when every operation went where it should.
+    rows = routing(uri, db_name)
+    for row in rows:
+        print(f"{row['page']:<10} {row['mode']:<19} {row['command']:<8} -> {', '.join(sorted(row['served']))}{'' if row['ok'] else '  UNEXPECTED'}")
+    return all(row["ok"] for row in rows)
+
+def cmd_replset(db, args):
+    with local_replica_set(args.port, args.members) as uri:
+        print(f"replica set up: RIDE_MONGO_URI='{uri}'")
+        ok = check_routing(uri, args.db)
+        if args.keep:
+            print("running; Ctrl-C to stop")
+            with contextlib.suppress(KeyboardInterrupt):
+                while True:
+                    time.sleep(1)
+    return 0 if ok else 1
+
+# ---------- Metrics exporter ----------
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+EXPECTED_METRICS = ["ride_loader_seconds_count", "ride_cache_lookups_total", "ride_cache_hit_ratio", "ride_reruns_total", "ride_active_sessions",
+                    "ride_mongo_pool_connections", "ride_mongo_commands_total", "ride_dataframe_bytes"]
+RUNS_PER_PAGE = 2
+
+def headless_exporter(args):
+    # Renders every page twice (cold, then from the session cache) in this process, with the
+    # exporter on a free port; returns its URL. A mongomock:// URI is seeded first.
+    from streamlit.testing.v1 import AppTest
+    from benchmark import page_errors
+    ride_repository.MONGO_CONFIG.update(uri=args.uri, database=args.db)  # the app imports this same module
+    if args.uri.startswith(ride_repository.MOCK_SCHEME):
+        datagen.seed_database(ride_repository.mongo_client(args.uri)[args.db], {"rides": 5000, "drivers": 50, "riders": 200, "zones": 10}, writers=1, ts=ride_repository.ts)
+    server = telemetry.serve(0)
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    for page in ride_repository.PAGES:
+        at.session_state["_page"] = page
+        for _ in range(RUNS_PER_PAGE):
+            at.run()
+            if at.exception:
+                raise SystemExit(f"{page}: {at.exception[0].value}")
+            if page_errors(at):
+                raise SystemExit(f"{page}: {page_errors(at)[0]}")
+    return f"http://127.0.0.1:{server.server_address[1]}/metrics"
+
+def total(samples, name, **labels):
+    return sum(value for (sample, have), value in samples.items() if sample == name and set(labels.items()) <= have)
+
+def metric_problems(samples, headless):
+    # Value checks; the exact ones only hold for the headless run, whose traffic is known.
+    problems = [f"{name}{dict(labels)} = {value:g} < 0" for (name, labels), value in samples.items() if name.startswith("ride_") and value < 0]
+    problems += [f"ride_cache_hit_ratio{dict(labels)} = {value:g} is outside [0, 1]" for (name, labels), value in samples.items() if name == "ride_cache_hit_ratio" and not 0 <= value <= 1]
+    problems += [f"ride_dataframe_bytes{dict(labels)} = 0" for (name, labels), value in samples.items() if name == "ride_dataframe_bytes" and not value]
+    if not headless:
+        return problems
+    for page in ride_repository.PAGES:
+        if total(samples, "ride_reruns_total", page=page) != RUNS_PER_PAGE:
+            problems.append(f"ride_reruns_total{{page={page!r}}} = {total(samples, 'ride_reruns_total', page=page):g}, expected {RUNS_PER_PAGE}")
+    hits, misses = total(samples, "ride_cache_lookups_total", result="hit"), total(samples, "ride_cache_lookups_total", result="miss")
+    if not hits or not misses:
+        problems.append(f"ride_cache_lookups_total: {hits:g} hits, {misses:g} misses; the cold and warm runs should give both")
+    # Every session-cache miss is one Mongo read; snapshot reads served from memory are not loads.
+    loads = sum(value for (name, labels), value in samples.items() if name == "ride_loader_seconds_count" and not dict(labels)["loader"].startswith("snapshot "))
+    if loads != misses:
+        problems.append(f"ride_loader_seconds_count = {loads:g} page loads for {misses:g} cache misses")
+    if not total(samples, "ride_dataframe_bytes", scope="session_cache"):
+        problems.append("ride_dataframe_bytes has no session_cache frames after the warm runs")
+    return problems
+
+def cmd_check_metrics(db, args):
+    url = args.metrics_url or headless_exporter(args)
+    try:
+        samples = telemetry.scrape(url)
+    except OSError as e:
+        print(f"scrape of {url} failed: {e}")
+        return 1
+    expected = [name for name in EXPECTED_METRICS if args.metrics_url or not args.uri.startswith(ride_repository.MOCK_SCHEME) or name != "ride_mongo_commands_total"]  # mongomock publishes no command events
+    missing = [name for name in expected if not any(sample == name for sample, _ in samples)]
+    for name in expected:
+        rows = {labels: value for (sample, labels), value in samples.items() if sample == name}
+        print(f"{'MISSING' if name in missing else 'ok':<8} {name:<32} {len(rows):>3} series" + (f"  e.g. {dict(next(iter(rows)))} = {next(iter(rows.values())):g}" if rows else ""))
+    problems = metric_problems(samples, headless=not args.metrics_url)
+    for problem in problems:
+        print(f"BAD      {problem}")
+    print(f"{len(samples)} samples from {url}")
+    return 1 if missing or problems else 0
+
+COMMANDS = {"check-metrics": cmd_check_metrics, "ensure-indexes": cmd_ensure_indexes, "explain": cmd_explain, "export-archive": cmd_export_archive, "migrate-timestamps": cmd_migrate_timestamps, "rebuild-rollup": cmd_rebuild_rollup, "replset": cmd_replset, "seed": cmd_seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ride-Sharing Intelligence maintenance commands.")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--uri", default=ride_repository.mongo_uri())
+    parser.add_argument("--db", default=ride_repository.MONGO_CONFIG["database"])
+    seeding = parser.add_argument_group("seed")
+    for name in ("rides", "drivers", "riders", "zones"):
+        seeding.add_argument(f"--{name}", type=int, default=datagen.DEMO_SCALE[name])
+    seeding.add_argument("--batch-size", type=int, default=datagen.DEFAULT_BATCH_SIZE)
+    seeding.add_argument("--writers", type=int, default=datagen.DEFAULT_WRITERS)
+    seeding.add_argument("--reset", choices=ride_repository.RESET_MODES, default="swap")
+    replset = parser.add_argument_group("replset")
+    replset.add_argument("--port", type=int, default=27117)
+    replset.add_argument("--members", type=int, default=2)
+    replset.add_argument("--keep", action="store_true", help="keep the set running after the routing check")
+    checks = parser.add_argument_group("check-metrics")
+    checks.add_argument("--metrics-url", help="scrape a running app's exporter (default: render every page headless in-process)")
+    args = parser.parse_args()
+    db = ride_repository.mongo_client(args.uri, serverSelectionTimeoutMS=3000, **ride_repository.client_options())[args.db]
+    return COMMANDS[args.command](db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
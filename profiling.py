@@ -0,0 +1,143 @@
+# profiling.py — opt-in per-rerun profiling: nested timed sections and MongoDB commands per section
+# A Profiler is activated on the script thread for one rerun. section() times a block under the
+# innermost open section; wrap() does the same for work handed to another thread (page fetches),
+# keeping the caller's section as parent. CommandTap charges every MongoDB command to the section
+# open on the thread that issued it, so counts are per rerun even with other sessions running.
+import contextlib
+import cProfile
+import os
+import threading
+import time
+from datetime import datetime
+
+from pymongo import monitoring
+
+try:
+    import pyinstrument
+except ImportError:  # optional: pip install pyinstrument
+    pyinstrument = None
+
+DUMPS = ["cprofile", "pyinstrument"]
+_local = threading.local()  # .stack: open sections on this thread, innermost last
+
+
+class Section:
+    __slots__ = ("name", "parent", "depth", "start", "end", "commands", "thread")
+
+    def __init__(self, name, parent, start):
+        self.name, self.parent, self.start, self.end = name, parent, start, None
+        self.depth = parent.depth + 1 if parent else 0
+        self.commands, self.thread = {}, threading.current_thread().name
+
+
+class Profiler:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.root = Section("rerun", None, self.t0)
+        self.sections, self.lock = [self.root], threading.Lock()
+
+    def _open(self, name, parent):
+        section = Section(name, parent, time.perf_counter())
+        with self.lock:
+            self.sections.append(section)
+        return section
+
+    @contextlib.contextmanager
+    def activate(self):
+        stack = _stack()
+        stack.append((self, self.root))
+        try:
+            yield self
+        finally:
+            stack.pop()
+            self.root.end = time.perf_counter()
+
+    def command(self, section, name):
+        with self.lock:
+            section.commands[name] = section.commands.get(name, 0) + 1
+
+    def rows(self):
+        # One row per section in start order; `commands` counts the section's own commands only.
+        end = self.root.end or time.perf_counter()
+        return [{"name": s.name, "depth": s.depth, "start_ms": (s.start - self.t0) * 1000, "ms": ((s.end or end) - s.start) * 1000,
+                 "commands": sum(s.commands.values()), "by_command": dict(s.commands), "thread": s.thread}
+                for s in sorted(self.sections, key=lambda s: s.start)]
+
+    def total_commands(self):
+        with self.lock:
+            return sum(sum(s.commands.values()) for s in self.sections)
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def current():
+    stack = _stack()
+    return stack[-1] if stack else (None, None)
+
+@contextlib.contextmanager
+def section(name, parent=None):
+    # No-op unless a Profiler is active on this thread (or `parent` names one explicitly).
+    profiler, open_section = parent or current()
+    if profiler is None:
+        yield
+        return
+    entered = profiler._open(name, open_section)
+    stack = _stack()
+    stack.append((profiler, entered))
+    try:
+        yield
+    finally:
+        stack.pop()
+        entered.end = time.perf_counter()
+
+def wrap(name, fn):
+    # For work run on another thread: times `fn` as a child of the caller's current section.
+    parent = current()
+    if parent[0] is None:
+        return fn
+    def run():
+        with section(name, parent):
+            return fn()
+    return run
+
+
+class CommandTap(monitoring.CommandListener):
+    # Pymongo publishes command events on the thread running the operation.
+    def started(self, event):
+        profiler, open_section = current()
+        if profiler is not None:
+            profiler.command(open_section, event.command_name)
+    def succeeded(self, event): pass
+    def failed(self, event): pass
+
+
+@contextlib.contextmanager
+def dump(kind, directory):
+    # Profiles the block with cProfile or pyinstrument (script thread only) and writes the result
+    # to `directory`; the yielded dict gets {"path": ...} on exit. kind=None profiles nothing.
+    out = {}
+    if kind is None or (kind == "pyinstrument" and pyinstrument is None):
+        yield out
+        return
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"rerun-{datetime.now():%Y%m%d-%H%M%S-%f}")
+    profiler = pyinstrument.Profiler() if kind == "pyinstrument" else cProfile.Profile()
+    if kind == "pyinstrument":
+        profiler.start()
+    else:
+        profiler.enable()
+    try:
+        yield out
+    finally:
+        if kind == "pyinstrument":
+            profiler.stop()
+            out["path"] = stem + ".html"
+            with open(out["path"], "w") as fh:
+                fh.write(profiler.output_html())
+        else:
+            profiler.disable()
+            out["path"] = stem + ".prof"  # python -m pstats <file>, or snakeviz
+            profiler.dump_stats(out["path"])
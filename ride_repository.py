@@ -0,0 +1,855 @@
+# ride_repository.py — MongoDB data access for the dashboard, with no Streamlit dependency
+# Connection settings, indexes, seeding, ride ids, schemas and every query the pages issue.
+# RideRepository returns plain dicts and DataFrames and raises on failure; app.py adds session
+# caching and st.error on top. AsyncRideRepository runs the same reads on an async driver
+# (pymongo's AsyncMongoClient or motor), so pages and benchmarks can issue them concurrently.
+import inspect
+import json
+import os
+import threading
+import warnings
+import weakref
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import archive
+import columnar
+import datagen
+
+from pymongo import MongoClient, ReadPreference, ReturnDocument, monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:  # pymongo<4.9: pass a motor database to AsyncRideRepository instead
+    AsyncMongoClient = None
+
+
+# ---------- Mongo connection ----------
+# Settings come from a JSON file (RIDE_MONGO_CONFIG, default ./ride_config.json if present),
+# then RIDE_MONGO_* env vars override it. Read routing is per page: analytics pages may read
+# from secondaries, writes always go through the primary handle returned by connect().
+MONGO_DEFAULTS = {
+    "uri": "mongodb://localhost:27017",
+    "database": "ride_demo",
+    "replica_set": None,
+    "read_preference": {"dashboard": "secondaryPreferred", "analytics": "secondaryPreferred"},  # other pages: primary
+    "read_concern": {"dashboard": "local", "analytics": "local"},  # other pages: server default
+}
+READ_PREFERENCES = {"primary": ReadPreference.PRIMARY, "primaryPreferred": ReadPreference.PRIMARY_PREFERRED, "secondary": ReadPreference.SECONDARY,
+                    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED, "nearest": ReadPreference.NEAREST}
+READ_CONCERNS = ["local", "available", "majority", "linearizable", "snapshot"]
+PAGES = ["dashboard", "realtime", "drivers", "surge", "analytics", "add_ride"]  # read-routing keys
+
+def load_mongo_config(path=None, environ=None):
+    environ = os.environ if environ is None else environ
+    config = {**MONGO_DEFAULTS, "read_preference": dict(MONGO_DEFAULTS["read_preference"]), "read_concern": dict(MONGO_DEFAULTS["read_concern"])}
+    path = path or environ.get("RIDE_MONGO_CONFIG") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "ride_config.json")
+    if os.path.exists(path):
+        with open(path) as fh:
+            loaded = json.load(fh)
+        for key in ("read_preference", "read_concern"):
+            config[key].update(loaded.pop(key, {}))
+        config.update(loaded)
+    elif environ.get("RIDE_MONGO_CONFIG"):
+        raise FileNotFoundError(f"RIDE_MONGO_CONFIG points to a missing file: {path}")
+    for key, env in (("uri", "RIDE_MONGO_URI"), ("database", "RIDE_MONGO_DB"), ("replica_set", "RIDE_MONGO_REPLICA_SET")):
+        config[key] = environ.get(env, config[key])
+    for page in PAGES:  # e.g. RIDE_MONGO_READ_PREFERENCE_ANALYTICS=secondary
+        for key in ("read_preference", "read_concern"):
+            value = environ.get(f"RIDE_MONGO_{key.upper()}_{page.upper()}")
+            if value:
+                config[key][page] = value
+    for page, mode in config["read_preference"].items():
+        if mode not in READ_PREFERENCES:
+            raise ValueError(f"unknown read preference {mode!r} for page {page!r}; expected one of {sorted(READ_PREFERENCES)}")
+    for page, level in config["read_concern"].items():
+        if level not in READ_CONCERNS:
+            raise ValueError(f"unknown read concern {level!r} for page {page!r}; expected one of {READ_CONCERNS}")
+    return config
+
+MONGO_CONFIG = load_mongo_config()
+
+def mongo_uri():
+    return MONGO_CONFIG["uri"]
+
+def redacted_uri(uri=None):
+    # For messages: the configured URI with any password masked.
+    scheme, sep, rest = (uri or mongo_uri()).partition("://")
+    userinfo, at, hosts = rest.rpartition("@")
+    return f"{scheme}{sep}{userinfo.split(':', 1)[0] + ':***' if ':' in userinfo else userinfo}{at}{hosts}"
+
+def client_options(config=None):
+    config = config or MONGO_CONFIG
+    return {"replicaSet": config["replica_set"]} if config["replica_set"] else {}
+
+def page_db(db, page, config=None):
+    # Same client and pool as `db`, with the page's read preference and read concern applied.
+    config = config or MONGO_CONFIG
+    mode, level = config["read_preference"].get(page, "primary"), config["read_concern"].get(page)
+    return db.client.get_database(db.name, read_preference=READ_PREFERENCES[mode], read_concern=ReadConcern(level))
+
+def pool_settings():
+    # Compressors are only negotiated if the server and the optional python libs support them.
+    settings = {
+        "maxPoolSize": int(os.environ.get("RIDE_MONGO_MAX_POOL_SIZE", 50)),
+        "minPoolSize": int(os.environ.get("RIDE_MONGO_MIN_POOL_SIZE", 2)),
+        "maxIdleTimeMS": int(os.environ.get("RIDE_MONGO_MAX_IDLE_TIME_MS", 300_000)),
+    }
+    compressors = os.environ.get("RIDE_MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+    if compressors:
+        settings["compressors"] = compressors
+    return settings
+
+class MongoMonitor(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    # CMAP + command monitoring: pool checkouts and wait times, and per-command latency.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = {"checkouts": 0, "checkout_failures": 0, "checked_out": 0, "open": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "cleared": 0}
+        self.commands = {}  # name -> {count, failures, total_ms, max_ms}
+        self.total_commands = 0
+
+    def _command(self, event, failed):
+        ms = event.duration_micros / 1000
+        with self.lock:
+            row = self.commands.setdefault(event.command_name, {"count": 0, "failures": 0, "total_ms": 0.0, "max_ms": 0.0})
+            row["count"] += 1
+            row["failures"] += failed
+            row["total_ms"] += ms
+            row["max_ms"] = max(row["max_ms"], ms)
+            self.total_commands += 1
+
+    def started(self, event): pass
+    def succeeded(self, event): self._command(event, False)
+    def failed(self, event): self._command(event, True)
+
+    def _pool(self, **deltas):
+        with self.lock:
+            for key, delta in deltas.items():
+                self.pool[key] += delta
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): self._pool(cleared=1)
+    def pool_closed(self, event): pass
+    def connection_created(self, event): self._pool(open=1)
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): self._pool(open=-1)
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): self._pool(checkout_failures=1)
+    def connection_checked_in(self, event): self._pool(checked_out=-1)
+
+    def connection_checked_out(self, event):
+        wait_ms = event.duration * 1000  # time spent waiting for the pool (pymongo>=4.7)
+        with self.lock:
+            self.pool["checkouts"] += 1
+            self.pool["checked_out"] += 1
+            self.pool["wait_ms_total"] += wait_ms
+            self.pool["wait_ms_max"] = max(self.pool["wait_ms_max"], wait_ms)
+
+    def snapshot(self):
+        with self.lock:
+            pool, commands = dict(self.pool), {name: dict(row) for name, row in self.commands.items()}
+        pool["wait_ms_avg"] = pool["wait_ms_total"] / pool["checkouts"] if pool["checkouts"] else 0.0
+        return pool, commands
+
+def prepare_database(db):
+    # Idempotent start-up work: indexes, plus the rollup and trend sums for data seeded before they existed.
+    ensure_indexes(db)
+    if db.revenue_rollup.estimated_document_count() == 0 and db.rides.estimated_document_count():
+        try:
+            rebuild_revenue_rollup(db)
+        except OperationFailure:
+            pass  # no $dateTrunc/$merge (MongoDB < 5.0, mongomock): the revenue chart stays empty
+    if db.trend_stats.estimated_document_count() == 0 and db.rides.estimated_document_count():
+        rebuild_trend_stats(db)
+    check_timestamps(db)
+
+# "mongomock://<name>" selects an in-process mock for CI and headless benchmarks (pip install
+# mongomock), one shared client per URI so a seeding script and the app see the same data. It has
+# no $unionWith or computed projections (reads take the legacy_server() paths), no $dateTrunc or
+# $merge (the rollup is only maintained incrementally), and emits no monitoring events.
+MOCK_SCHEME = "mongomock://"
+_mock_clients = {}
+
+def mongo_client(uri, **options):
+    if not uri.startswith(MOCK_SCHEME):
+        return MongoClient(uri, **options)
+    if uri not in _mock_clients:
+        import mongomock
+        _mock_clients[uri] = mongomock.MongoClient()
+    return _mock_clients[uri]
+
+_legacy = weakref.WeakKeyDictionary()  # client -> bool
+
+def legacy_server(db):
+    # $unionWith and expressions in find projections need MongoDB 4.4; against older servers and
+    # mongomock the sync reads fall back to client-side equivalents with the same results.
+    client = db.client
+    if client not in _legacy:
+        _legacy[client] = type(client).__module__.startswith("mongomock") or tuple(client.server_info()["versionArray"][:2]) < (4, 4)
+    return _legacy[client]
+
+def connect(config=None, event_listeners=(), timeout_ms=3000, prepare=True):
+    # Primary handle: writes, seeding, change streams. Page reads go through page_db().
+    config = config or MONGO_CONFIG
+    client = mongo_client(config["uri"], serverSelectionTimeoutMS=timeout_ms, event_listeners=list(event_listeners), **client_options(config), **pool_settings())
+    client.admin.command("ping")
+    db = client[config["database"]]
+    if prepare:
+        prepare_database(db)
+    return db
+
+def connect_async(config=None, event_listeners=(), timeout_ms=3000):
+    # Async handle with the same settings; no ping, since the client connects lazily on first use.
+    if AsyncMongoClient is None:
+        raise RuntimeError("async access needs pymongo>=4.9 (AsyncMongoClient); or wrap a motor database in AsyncRideRepository")
+    config = config or MONGO_CONFIG
+    client = AsyncMongoClient(config["uri"], serverSelectionTimeoutMS=timeout_ms, event_listeners=list(event_listeners), **client_options(config), **pool_settings())
+    return client[config["database"]]
+
+# ---------- Timestamps ----------
+# "native" stores BSON dates (range scans, $dateTrunc); "iso" keeps the legacy isoformat strings.
+TIMESTAMP_MODE = os.environ.get("RIDE_TIMESTAMP_MODE", "native")
+TIMESTAMP_FIELDS = {"rides": ["request_time", "start_time", "end_time"], "surge_pricing": ["timestamp"]}
+
+def ts(value):
+    if value is None or TIMESTAMP_MODE == "native":
+        return value
+    return value.isoformat()
+
+def timestamp_types(db):
+    # {collection: {"string", "date"}} — the BSON types held by its first timestamp field, the one
+    # filters and keyset paging use (request_time is indexed; surge_pricing has one row per zone).
+    return {col: {kind for kind in ("string", "date") if db[col].find_one({fields[0]: {"$type": kind}}, {"_id": 1}) is not None}
+            for col, fields in TIMESTAMP_FIELDS.items()}
+
+def check_timestamps(db):
+    # Range filters and keyset cursors compare one BSON type, so rows stored as the other type are
+    # silently skipped. Only warns: rewriting the data is left to `manage.py migrate-timestamps`.
+    types = timestamp_types(db)
+    stale = "string" if TIMESTAMP_MODE == "native" else "date"
+    if not any(stale in kinds for kinds in types.values()):
+        return
+    mixed = ", ".join(col for col, kinds in types.items() if stale in kinds)
+    warnings.warn(f"{mixed}: timestamps stored as {stale}s while RIDE_TIMESTAMP_MODE={TIMESTAMP_MODE}; time filters and paging skip those rows"
+                  + (" (run python manage.py migrate-timestamps)" if stale == "string" else ""), stacklevel=2)
+
+def migrate_timestamps(db):
+    # One-shot, server-side conversion of legacy ISO strings to BSON dates; safe to re-run.
+    migrated = {}
+    for col, fields in TIMESTAMP_FIELDS.items():
+        convert = {f: {"$cond": [{"$eq": [{"$type": f"${f}"}, "string"]}, {"$dateFromString": {"dateString": f"${f}"}}, f"${f}"]} for f in fields}
+        result = db[col].update_many({"$or": [{f: {"$type": "string"}} for f in fields]}, [{"$set": convert}])
+        migrated[col] = result.modified_count
+    return migrated
+
+# ---------- Indexes ----------
+# (collection, keys, options, query the index serves) — mirrors the query shapes below.
+INDEXES = [
+    ("rides", [("ride_id", 1)], {"unique": True}, "ride_id uniqueness (backstop for the ride_id counter)"),
+    ("rides", [("request_time", -1), ("ride_id", -1)], {}, "ride snapshot / get_all_rides server-side sort; unfiltered keyset pages"),
+    ("rides", [("status", 1), ("request_time", -1), ("ride_id", -1)], {}, "Real-Time Rides status filter + keyset pages; distinct statuses"),
+    ("rides", [("status", 1), ("total_fare", 1), ("rating", 1)], {}, "get_dashboard_metrics covered scan (hinted)"),
+    ("rides", [("driver_id", 1)], {}, "rides per driver"),
+    ("rides", [("rider_id", 1)], {}, "rides per rider"),
+    ("rides", [("updated_at", 1)], {"sparse": True}, "live feed polling fallback: status changes since the last poll"),
+    ("drivers", [("driver_id", 1)], {"unique": True}, "driver snapshot sort; driver lookups"),
+    ("drivers", [("status", 1)], {}, "available drivers ($unionWith in get_dashboard_metrics)"),
+    ("riders", [("rider_id", 1)], {"unique": True}, "Add New Ride rider list sort; rider lookups"),
+    ("vehicles", [("vehicle_id", 1)], {"unique": True}, "vehicle lookups by vehicle_id"),
+    ("surge_pricing", [("zone_id", 1)], {"unique": True}, "surge snapshot sort; zone lookups"),
+    ("revenue_rollup", [("granularity", 1), ("bucket", 1)], {"unique": True}, "revenue trend range reads; rollup $merge/$inc upserts"),
+]
+
+RIDES_SORT = [("request_time", -1), ("ride_id", -1)]
+METRICS_HINT = "status_1_total_fare_1_rating_1"
+
+def ensure_indexes(db, collections=None, suffix=""):
+    # createIndex is idempotent, so this is cheap on every connect/seed; failures (e.g. legacy
+    # duplicate ride_ids blocking a unique index) are reported instead of breaking the app.
+    # `suffix` targets staging copies (e.g. rides__staging) before they are swapped in.
+    report = []
+    for col, keys, options, serves in INDEXES:
+        if collections is not None and col not in collections:
+            continue
+        try:
+            name = db[col + suffix].create_index(keys, **options)
+            report.append({"collection": col, "index": name, "serves": serves, "error": None})
+        except OperationFailure as e:
+            report.append({"collection": col, "index": "_".join(f"{k}_{d}" for k, d in keys), "serves": serves, "error": str(e)})
+    return report
+
+def query_shapes():
+    # Every filtered/sorted query the pages issue, in a form that can be explained.
+    return [
+        ("Dashboard", "rides", {"aggregate": "rides", "pipeline": dashboard_metrics_pipeline(), "hint": METRICS_HINT, "cursor": {}}),
+        ("Dashboard / Analytics", "rides", {"find": "rides", "filter": {}, "projection": {"_id": 0}, "sort": dict(RIDES_SORT)}),
+        ("Real-Time Rides", "rides", {"distinct": "rides", "key": "status", "query": {}}),
+        ("Real-Time Rides", "rides", {"find": "rides", "filter": keyset_query(["pending"], (ts(datetime.now()), "RIDE0001"), ts(datetime.now() - timedelta(days=7))), "sort": dict(RIDES_SORT), "limit": RIDES_PAGE_SIZE + 1}),
+        ("Real-Time Rides", "rides", {"find": "rides", "filter": keyset_query(["pending"], since=ts(datetime.now() - timedelta(hours=1))), "projection": ride_projection(PAGE_COLUMNS["map"])}),
+        ("Real-Time Rides", "rides", {"aggregate": "rides", "pipeline": grid_cells_pipeline(keyset_query(["pending"])), "cursor": {}}),
+        ("Dashboard", "revenue_rollup", {"find": "revenue_rollup", "filter": {"granularity": "day", "bucket": {"$gte": datetime.now() - timedelta(days=7)}}, "sort": {"bucket": 1}}),
+        ("Dashboard / Driver Management / Add New Ride", "drivers", {"find": "drivers", "filter": {}, "projection": {"_id": 0}, "sort": {"driver_id": 1}}),
+        ("Surge Pricing", "surge_pricing", {"find": "surge_pricing", "filter": {}, "projection": {"_id": 0}, "sort": {"zone_id": 1}}),
+        ("Add New Ride", "riders", {"find": "riders", "filter": {}, "projection": {"_id": 0}, "sort": {"rider_id": 1}}),
+    ]
+
+def _plan_stages(node):
+    if isinstance(node, dict):
+        if isinstance(node.get("stage"), str):
+            yield node["stage"]
+        for value in node.values():
+            yield from _plan_stages(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _plan_stages(value)
+
+def explain_query_shapes(db):
+    report = []
+    for page, col, command in query_shapes():
+        plan = db.command("explain", command, verbosity="queryPlanner")
+        stages = sorted(set(_plan_stages(plan)))
+        report.append({"page": page, "collection": col, "stages": stages, "collscan": "COLLSCAN" in stages})
+    return report
+
+# ---------- Seeding ----------
+SEED_COLLECTIONS = ['drivers', 'riders', 'vehicles', 'rides', 'surge_pricing']
+STAGING_SUFFIX = "__staging"
+# "swap": load into empty staging collections (indexes prebuilt) and renameCollection them over
+#         the live ones, so readers see either the old data or the complete new data.
+# "drop": drop and recreate the live collections in place; fastest, but readers see them empty.
+RESET_MODES = ["swap", "drop"]
+
+def reseed(db, scale=None, batch_size=datagen.DEFAULT_BATCH_SIZE, writers=datagen.DEFAULT_WRITERS, reset="swap", on_progress=None):
+    # Returns per-collection write stats ({docs, seconds, docs_per_sec}); raises on failure.
+    # Both modes drop whole collections instead of delete_many, which removes documents one by one.
+    suffix = STAGING_SUFFIX if reset == "swap" else ""
+    for col in SEED_COLLECTIONS:
+        db.drop_collection(col + suffix)
+    ensure_indexes(db, SEED_COLLECTIONS, suffix)
+    stats = datagen.seed_database(db, scale, batch_size=batch_size, writers=writers, ts=ts, names={col: col + suffix for col in SEED_COLLECTIONS}, on_progress=on_progress)
+    if suffix:
+        for col in SEED_COLLECTIONS:
+            db[col + suffix].rename(col, dropTarget=True)
+    db.counters.update_one({"_id": "ride_id"}, {"$set": {"seq": stats["rides"]["docs"]}}, upsert=True)
+    try:
+        rebuild_revenue_rollup(db)
+    except OperationFailure:
+        db.drop_collection("revenue_rollup")  # no $dateTrunc/$merge (MongoDB < 5.0, mongomock): drop the old rides' buckets, the chart stays empty
+    rebuild_trend_stats(db)
+    if ARCHIVE_DIR:
+        archive.clear(ARCHIVE_DIR)  # archived days belong to the replaced rides
+    return stats
+
+# ---------- Ride IDs ----------
+# ride_id numbers come from a counter document bumped with $inc, so allocation is O(1) and
+# never repeats across sessions or processes. Each process reserves RIDE_ID_BLOCK ids per
+# round trip; unused ids in a block are simply skipped after a restart.
+RIDE_ID_BLOCK = int(os.environ.get("RIDE_ID_BLOCK", 20))
+
+def ride_id_str(number):
+    return f"RIDE{str(number).zfill(4)}"
+
+def sync_ride_counter(db):
+    # Ensures the counter is at least the highest existing ride number (databases seeded before
+    # the counter existed); $max keeps this safe to race with live allocations.
+    if db.counters.find_one({"_id": "ride_id"}) is None:
+        # Only ids of the ride_id_str form count; the $match keeps $toLong from failing on imported
+        # or hand-edited ride_ids (18 digits always fit in a long).
+        top = next(db.rides.aggregate([{"$match": {"ride_id": {"$regex": r"^RIDE\d{1,18}$"}}},
+                                       {"$group": {"_id": None, "max": {"$max": {"$toLong": {"$arrayElemAt": [{"$split": ["$ride_id", "RIDE"]}, 1]}}}}}]), {})
+        db.counters.update_one({"_id": "ride_id"}, {"$max": {"seq": top.get("max") or 0}}, upsert=True)
+
+def reserve_ids(db, name, count):
+    # Returns the first of `count` consecutive ids reserved atomically.
+    counter = db.counters.find_one_and_update({"_id": name}, {"$inc": {"seq": count}}, upsert=True, return_document=ReturnDocument.AFTER)
+    return counter["seq"] - count + 1
+
+class IdAllocator:
+    def __init__(self, db, name, block=RIDE_ID_BLOCK):
+        self.db, self.name, self.block = db, name, block
+        self.lock = threading.Lock()
+        self.next_id, self.last_id = 1, 0
+
+    def next(self):
+        with self.lock:
+            if self.next_id > self.last_id:
+                self.next_id = reserve_ids(self.db, self.name, self.block)
+                self.last_id = self.next_id + self.block - 1
+            self.next_id += 1
+            return self.next_id - 1
+
+    def reset(self):
+        with self.lock:
+            self.next_id, self.last_id = 1, 0
+
+def create_ride(db, allocator, ride, attempts=3):
+    # A reseed resets the counter under an allocator's cached block; the unique ride_id index
+    # turns that into a DuplicateKeyError, after which a fresh block is reserved.
+    for attempt in range(attempts):
+        ride["ride_id"] = ride_id_str(allocator.next())
+        ride.pop("_id", None)
+        try:
+            db.rides.insert_one(ride)
+            return ride
+        except DuplicateKeyError:
+            allocator.reset()
+            if attempt == attempts - 1:
+                raise
+
+# ---------- Data access ----------
+def dashboard_metrics_pipeline():
+    # One round trip: ride totals are grouped server-side and available drivers are
+    # folded in via $unionWith, so only a single summary document crosses the wire.
+    return [
+        {"$project": {"_id": 0, "status": 1, "total_fare": 1, "rating": 1}},
+        {"$unionWith": {"coll": "drivers", "pipeline": [
+            {"$match": {"status": "available"}},
+            {"$project": {"_id": 0, "_available_driver": {"$literal": 1}}},
+        ]}},
+        {"$facet": {"summary": [{"$group": {
+            "_id": None,
+            "total_rides": {"$sum": {"$cond": [{"$eq": ["$_available_driver", 1]}, 0, 1]}},
+            "active_drivers": {"$sum": {"$ifNull": ["$_available_driver", 0]}},
+            "total_revenue": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, {"$ifNull": ["$total_fare", 0]}, 0]}},
+            "avg_rating": {"$avg": "$rating"},  # $avg skips null/missing ratings
+        }}]}},
+    ]
+
+def legacy_dashboard_metrics(db):
+    # No $unionWith: ride totals and available drivers in two round trips, same summary shape.
+    row = next(db.rides.aggregate([{"$group": {
+        "_id": None, "total_rides": {"$sum": 1},
+        "total_revenue": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, {"$ifNull": ["$total_fare", 0]}, 0]}},
+        "avg_rating": {"$avg": "$rating"},
+    }}]), None)
+    if row is None:
+        return None
+    return {"summary": [{**row, "active_drivers": db.drivers.count_documents({"status": "available"})}]}
+
+# Columns each page actually renders; loaders project to these instead of whole documents.
+PAGE_COLUMNS = {
+    "dashboard": ['ride_id','status'],
+    "realtime": ['ride_id','driver_id','rider_id','status','distance_km','total_fare','surge_multiplier','request_time'],
+    "map": ['pickup_lat','pickup_lng','dropoff_lat','dropoff_lng'],
+    "analytics": ['ride_id','status','distance_km','duration_minutes','surge_multiplier','total_fare','rating','request_time'],
+}
+RIDES_PAGE_SIZE = 50
+# Nested fields flattened by the server in the projection, so frames never hold location dicts.
+FLATTENED_FIELDS = {
+    "pickup_address": "$pickup_location.address", "pickup_lat": "$pickup_location.lat", "pickup_lng": "$pickup_location.lng",
+    "dropoff_address": "$dropoff_location.address", "dropoff_lat": "$dropoff_location.lat", "dropoff_lng": "$dropoff_location.lng",
+    "location_lat": "$location.lat", "location_lng": "$location.lng",
+}
+# Column schemas the loaders materialize into (see columnar.py); kinds: string, float64, int64, datetime.
+RIDES_SCHEMA = {
+    "ride_id": "string", "driver_id": "string", "rider_id": "string",
+    "pickup_address": "string", "pickup_lat": "float64", "pickup_lng": "float64",
+    "dropoff_address": "string", "dropoff_lat": "float64", "dropoff_lng": "float64",
+    "request_time": "datetime", "start_time": "datetime", "end_time": "datetime", "status": "string",
+    "distance_km": "float64", "duration_minutes": "int64", "base_fare": "float64", "surge_multiplier": "float64",
+    "total_fare": "float64", "payment_status": "string", "rating": "float64",
+}
+DRIVERS_SCHEMA = {
+    "driver_id": "string", "name": "string", "phone": "string", "rating": "float64", "total_rides": "int64", "status": "string",
+    "location_lat": "float64", "location_lng": "float64", "earnings_today": "float64", "vehicle_id": "string",
+}
+SURGE_SCHEMA = {
+    "zone_id": "string", "zone_name": "string", "current_surge": "float64", "demand_level": "string",
+    "available_drivers": "int64", "active_requests": "int64", "timestamp": "datetime", "avg_wait_time": "int64",
+}
+RIDERS_SCHEMA = {
+    "rider_id": "string", "name": "string", "phone": "string", "rating": "float64", "total_rides": "int64",
+    "payment_method": "string", "wallet_balance": "float64",
+}
+
+# Compact dtypes applied after loading: categoricals for enums and repeated IDs (ride_id is
+# unique per row, so it stays a string), float32 for coordinates and money, nullable Int for
+# counts, datetime64 for times. groupby on these columns must pass observed=True.
+RIDES_DTYPES = {
+    "driver_id": "category", "rider_id": "category", "status": "category", "payment_status": "category",
+    "pickup_address": "category", "dropoff_address": "category",
+    "pickup_lat": "float32", "pickup_lng": "float32", "dropoff_lat": "float32", "dropoff_lng": "float32",
+    "request_time": "datetime64[ms]", "start_time": "datetime64[ms]", "end_time": "datetime64[ms]",
+    "distance_km": "float32", "duration_minutes": "Int16", "base_fare": "float32", "surge_multiplier": "float32",
+    "total_fare": "float32", "rating": "float32",
+}
+DRIVERS_DTYPES = {"status": "category", "rating": "float32", "total_rides": "Int32", "location_lat": "float32", "location_lng": "float32", "earnings_today": "float32"}
+SURGE_DTYPES = {"demand_level": "category", "current_surge": "float32", "available_drivers": "Int16", "active_requests": "Int16", "avg_wait_time": "Int16", "timestamp": "datetime64[ms]"}
+
+def flat_projection(columns, legacy=False):
+    # legacy: project the parent documents instead and flatten() each result client-side.
+    if legacy:
+        return {'_id': 0, **{FLATTENED_FIELDS[c][1:].split('.')[0] if c in FLATTENED_FIELDS else c: 1 for c in columns}}
+    return {'_id': 0, **{c: FLATTENED_FIELDS.get(c, 1) for c in columns}}
+
+def ride_projection(columns, legacy=False):
+    return flat_projection(columns or RIDES_SCHEMA, legacy)
+
+def flatten(doc):
+    for column, path in FLATTENED_FIELDS.items():
+        parent, child = path[1:].split('.')
+        if isinstance(doc.get(parent), dict):
+            doc[column] = doc[parent].get(child)
+    for parent in {path[1:].split('.')[0] for path in FLATTENED_FIELDS.values()}:
+        doc.pop(parent, None)
+    return doc
+
+def load_frame(collection, schema, columns=None, query=None, sort=None, dtypes=None):
+    # Arrow decoding needs BSON dates; legacy ISO timestamps go through the NumPy path.
+    schema = {c: schema[c] for c in columns} if columns else schema
+    if legacy_server(collection.database):
+        cursor = collection.find(query or {}, flat_projection(schema, legacy=True))
+        df = columnar.frame_from_cursor(map(flatten, cursor.sort(sort) if sort else cursor), schema)
+    else:
+        df = columnar.find_frame(collection, query or {}, flat_projection(schema), schema, sort=sort, use_arrow=TIMESTAMP_MODE == "native")
+    return columnar.compact(df, dtypes) if dtypes else df
+
+def rides_frame(rides, columns=None):
+    df = pd.DataFrame(rides, columns=columns)
+    if 'request_time' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['request_time']):
+        df['request_time'] = pd.to_datetime(df['request_time'])  # legacy ISO strings only
+    return df
+
+def keyset_query(statuses=None, after=None, since=None):
+    # Keyset pagination on (request_time, ride_id) descending: the next page starts strictly
+    # after the last row of the previous one, so each page is an index range scan + limit.
+    query = {}
+    if statuses is not None:
+        query["status"] = {"$in": list(statuses)}
+    if since is not None:
+        query["request_time"] = {"$gte": since}
+    if after is not None:
+        last_time, last_id = after
+        query["$or"] = [{"request_time": {"$lt": last_time}}, {"request_time": last_time, "ride_id": {"$lt": last_id}}]
+    return query
+
+# ---------- Revenue rollup ----------
+# revenue_rollup holds one document per (granularity, bucket), so the revenue chart reads
+# a handful of buckets instead of every ride. Buckets are always BSON dates.
+ROLLUP_UNITS = {"day": timedelta(days=7), "hour": timedelta(hours=48)}  # unit -> span shown
+
+def rollup_pipeline(unit, match=None, into="revenue_rollup"):
+    # Rebuild path: group completed rides into buckets and upsert them; $toDate also handles ISO strings.
+    return [
+        {"$match": {"status": "completed", **(match or {})}},
+        {"$group": {"_id": {"$dateTrunc": {"date": {"$toDate": "$request_time"}, "unit": unit}}, "revenue": {"$sum": "$total_fare"}, "rides": {"$sum": 1}}},
+        {"$project": {"_id": 0, "granularity": {"$literal": unit}, "bucket": "$_id", "revenue": 1, "rides": 1}},
+        {"$merge": {"into": into, "on": ["granularity", "bucket"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+def rebuild_revenue_rollup(db):
+    # Built beside the live rollup and swapped in, so the chart never reads a partial rollup.
+    staging = "revenue_rollup" + STAGING_SUFFIX
+    db.drop_collection(staging)
+    ensure_indexes(db, ["revenue_rollup"], STAGING_SUFFIX)  # $merge needs the unique (granularity, bucket) index
+    try:
+        for unit in ROLLUP_UNITS:
+            db.rides.aggregate(rollup_pipeline(unit, into=staging))
+    except OperationFailure:
+        db.drop_collection(staging)
+        raise
+    db[staging].rename("revenue_rollup", dropTarget=True)
+
+def rollup_bucket(moment, unit):
+    moment = datetime.fromisoformat(moment) if isinstance(moment, str) else moment
+    return moment.replace(minute=0, second=0, microsecond=0) if unit == "hour" else datetime.combine(moment.date(), datetime.min.time())
+
+def record_ride_completion(db, ride):
+    # Incremental path, called by complete_ride once per ride as it becomes completed. If this
+    # write fails after the status change, `manage.py rebuild-rollup` recomputes the buckets.
+    for unit in ROLLUP_UNITS:
+        db.revenue_rollup.update_one({"granularity": unit, "bucket": rollup_bucket(ride["request_time"], unit)}, {"$inc": {"revenue": ride.get("total_fare") or 0, "rides": 1}}, upsert=True)
+
+# ---------- Trendlines (incremental OLS) ----------
+# trend_stats keeps one document of running sums per scatter chart (n, Σx, Σy, Σx², Σxy, Σy²
+# and the x range) over completed rides, so a trendline is a few arithmetic ops on stored
+# sums instead of a statsmodels fit over every ride.
+TREND_MODELS = {"duration_distance": ("distance_km", "duration_minutes"), "rating_fare": ("total_fare", "rating")}  # model -> (x, y)
+
+def trend_pipeline(x, y):
+    return [
+        {"$match": {"status": "completed", x: {"$type": "number"}, y: {"$type": "number"}}},
+        {"$group": {"_id": None, "n": {"$sum": 1}, "sx": {"$sum": f"${x}"}, "sy": {"$sum": f"${y}"},
+                    "sxx": {"$sum": {"$multiply": [f"${x}", f"${x}"]}}, "sxy": {"$sum": {"$multiply": [f"${x}", f"${y}"]}},
+                    "syy": {"$sum": {"$multiply": [f"${y}", f"${y}"]}}, "x_min": {"$min": f"${x}"}, "x_max": {"$max": f"${x}"}}},
+        {"$project": {"_id": 0}},
+    ]
+
+def rebuild_trend_stats(db):
+    for model, (x, y) in TREND_MODELS.items():
+        sums = next(db.rides.aggregate(trend_pipeline(x, y)), None)
+        if sums:
+            db.trend_stats.replace_one({"_id": model}, sums, upsert=True)
+        else:
+            db.trend_stats.delete_one({"_id": model})
+
+def record_trend_point(db, ride):
+    # Incremental path, called by complete_ride: adds the ride to every model it has both values for.
+    for model, (x, y) in TREND_MODELS.items():
+        if isinstance(ride.get(x), (int, float)) and isinstance(ride.get(y), (int, float)):
+            db.trend_stats.update_one({"_id": model}, {"$inc": {"n": 1, "sx": ride[x], "sy": ride[y], "sxx": ride[x] * ride[x], "sxy": ride[x] * ride[y], "syy": ride[y] * ride[y]},
+                                                       "$min": {"x_min": ride[x]}, "$max": {"x_max": ride[x]}}, upsert=True)
+
+def trend_fit(sums):
+    # Least squares from the running sums; None until there are two distinct x values.
+    n = sums.get("n", 0) if sums else 0
+    denom = n * sums["sxx"] - sums["sx"] ** 2 if n else 0
+    if n < 2 or denom <= 0:
+        return None
+    slope = (n * sums["sxy"] - sums["sx"] * sums["sy"]) / denom
+    intercept = (sums["sy"] - slope * sums["sx"]) / n
+    ss_tot = sums["syy"] - sums["sy"] ** 2 / n
+    ss_res = sums["syy"] - intercept * sums["sy"] - slope * sums["sxy"]
+    return {"n": n, "slope": slope, "intercept": intercept, "r2": 1 - ss_res / ss_tot if ss_tot > 0 else None, "x_min": sums["x_min"], "x_max": sums["x_max"]}
+
+# ---------- Ride status changes ----------
+# pending -> in_progress -> completed, or cancelled from either open status. Each change is
+# guarded on the current status, so a repeated or raced request is a no-op (None) and a ride
+# enters the rollup exactly once, at completion.
+RIDE_TRANSITIONS = {"pending": ["in_progress", "cancelled"], "in_progress": ["completed", "cancelled"]}
+
+def _transition(db, ride_id, status, fields=None):
+    # updated_at lets the Real-Time live feed's polling fallback find status changes.
+    sources = [s for s, targets in RIDE_TRANSITIONS.items() if status in targets]
+    return db.rides.find_one_and_update({"ride_id": ride_id, "status": {"$in": sources}}, {"$set": {"status": status, "updated_at": ts(datetime.now()), **(fields or {})}}, return_document=ReturnDocument.AFTER)
+
+def start_ride(db, ride_id):
+    return _transition(db, ride_id, "in_progress", {"start_time": ts(datetime.now())})
+
+def cancel_ride(db, ride_id):
+    return _transition(db, ride_id, "cancelled")
+
+def ride_minutes(start, end):
+    start = datetime.fromisoformat(start) if isinstance(start, str) else start
+    return max(1, round((end - start).total_seconds() / 60)) if start else None
+
+def complete_ride(db, ride_id, rating=None):
+    # Sets duration_minutes (from start_time, else request_time) so the ride also feeds the
+    # duration/distance trendline, then folds it into the rollup and the trend sums.
+    now, ride = datetime.now(), db.rides.find_one({"ride_id": ride_id}, {"_id": 0, "start_time": 1, "request_time": 1, "duration_minutes": 1})
+    if ride is None:
+        return None
+    duration = ride.get("duration_minutes") or ride_minutes(ride.get("start_time") or ride.get("request_time"), now)
+    ride = _transition(db, ride_id, "completed", {"payment_status": "paid", "end_time": ts(now), "duration_minutes": duration, "rating": rating})
+    if ride is not None:
+        record_ride_completion(db, ride)
+        record_trend_point(db, ride)
+    return ride
+
+def advance_ride(db, ride_id, status, rating=None):
+    # Returns the updated ride, or None when the ride was not in a status that allows the change.
+    if status == "completed":
+        return complete_ride(db, ride_id, rating)
+    return {"in_progress": start_ride, "cancelled": cancel_ride}[status](db, ride_id)
+
+def map_points(rides):
+    # Pickups and dropoffs stacked into one lat/lon frame with column operations only.
+    ends = [rides[[f"{end}_lat", f"{end}_lng"]].set_axis(['lat', 'lon'], axis=1) for end in ("pickup", "dropoff") if f"{end}_lat" in rides]
+    if not ends:
+        return pd.DataFrame(columns=['lat', 'lon'])
+    return pd.concat(ends, ignore_index=True).apply(pd.to_numeric, errors='coerce').astype('float64').dropna()  # st.map cannot serialize float32
+
+MAP_CELL_DEGREES = float(os.environ.get("RIDE_MAP_CELL_DEGREES", 0.005))  # ~550 m of latitude
+
+def grid_cells_pipeline(query, cell=MAP_CELL_DEGREES):
+    def cell_of(end):
+        return {axis: {"$floor": {"$divide": [f"${end}_location.{axis}", cell]}} for axis in ("lat", "lng")}
+    return [
+        {"$match": query},
+        {"$project": {"_id": 0, "cells": [cell_of("pickup"), cell_of("dropoff")]}},
+        {"$unwind": "$cells"},
+        {"$match": {"cells.lat": {"$ne": None}, "cells.lng": {"$ne": None}}},
+        {"$group": {"_id": "$cells", "count": {"$sum": 1}}},
+    ]
+
+# ---------- Parquet archive (optional, needs pyarrow) ----------
+# Completed rides from closed days are exported once to RIDE_ARCHIVE_DIR; the rides snapshot
+# then reads them from Parquet and only asks MongoDB for the tail (see archive.tail_query).
+# A day closes ARCHIVE_LAG_DAYS after its midnight, leaving time for late completions.
+ARCHIVE_DIR = os.environ.get("RIDE_ARCHIVE_DIR", "")  # empty: archive disabled
+ARCHIVE_LAG_DAYS = int(os.environ.get("RIDE_ARCHIVE_LAG_DAYS", 1))
+
+def archive_enabled():
+    return bool(ARCHIVE_DIR) and archive.available() and TIMESTAMP_MODE == "native"  # day ranges need BSON dates
+
+def export_archive(db, root=ARCHIVE_DIR, lag_days=ARCHIVE_LAG_DAYS):
+    # Exports every closed day not archived yet; returns {day: rows} for the days written.
+    manifest = archive.read_manifest(root)
+    cutoff = datetime.combine(date.today() - timedelta(days=lag_days), datetime.min.time())
+    day = manifest["watermark"]
+    if day is None:
+        first = db.rides.find_one({"status": "completed"}, {"_id": 0, "request_time": 1}, sort=[("request_time", 1)])
+        day = datetime.combine(first["request_time"].date(), datetime.min.time()) if first else cutoff
+    if day >= cutoff and manifest["watermark"] is not None:
+        return {}
+    partitions, exported = dict(manifest["partitions"]), {}
+    while day < cutoff:
+        frame = load_frame(db.rides, RIDES_SCHEMA, query={"status": "completed", "request_time": {"$gte": day, "$lt": day + timedelta(days=1)}}, sort=RIDES_SORT)
+        if len(frame):
+            archive.write_partition(root, day, frame)
+        partitions[f"{day:%Y-%m-%d}"] = exported[f"{day:%Y-%m-%d}"] = len(frame)
+        day += timedelta(days=1)
+    os.makedirs(root, exist_ok=True)
+    archive.write_manifest(root, cutoff, partitions)
+    return exported
+
+# Every column any page reads from the shared rides frame (see SnapshotStore in app.py).
+SNAPSHOT_RIDE_COLUMNS = list(dict.fromkeys([*PAGE_COLUMNS["dashboard"], *PAGE_COLUMNS["realtime"], *PAGE_COLUMNS["analytics"]]))
+
+def load_rides_snapshot(db, reader=None):
+    columns = SNAPSHOT_RIDE_COLUMNS
+    watermark, history = reader.frame(columns, RIDES_DTYPES) if reader is not None else (None, None)
+    if watermark is None:
+        return load_frame(db.rides, RIDES_SCHEMA, columns, sort=RIDES_SORT, dtypes=RIDES_DTYPES)
+    tail = load_frame(db.rides, RIDES_SCHEMA, columns, archive.tail_query(watermark), RIDES_SORT, RIDES_DTYPES)
+    if len(tail):
+        history = history[~history["ride_id"].isin(tail["ride_id"])]  # the tail's copy is the current one
+    frame = pd.concat([tail, history], ignore_index=True).sort_values(["request_time", "ride_id"], ascending=False, ignore_index=True)
+    return columnar.compact(frame, RIDES_DTYPES)  # re-unify categoricals whose categories differed
+
+# ---------- Page reads ----------
+# Result shaping shared by the sync and async repositories, so both return identical frames.
+EMPTY_METRICS = {"total_rides": 0, "active_drivers": 0, "total_revenue": 0, "avg_rating": 0}
+
+def metrics_summary(doc):
+    row = ((doc or {}).get("summary") or [{}])[0]
+    avg_rating = row.get("avg_rating")
+    return {"total_rides": row.get("total_rides", 0), "active_drivers": row.get("active_drivers", 0), "total_revenue": row.get("total_revenue", 0), "avg_rating": round(avg_rating, 2) if avg_rating is not None else 0}
+
+def page_fields(columns):
+    return list(dict.fromkeys([*columns, 'request_time', 'ride_id']))  # keyset cursor fields
+
+def split_page(rides, columns, page_size):
+    # page_size + 1 rows were fetched; the extra one only says whether an older page exists.
+    next_after = (rides[page_size - 1]['request_time'], rides[page_size - 1]['ride_id']) if len(rides) > page_size else None
+    return rides_frame(rides[:page_size], columns), next_after
+
+def revenue_since(unit, now=None):
+    now = now or datetime.now()
+    return rollup_bucket(now - ROLLUP_UNITS[unit] + (timedelta(days=1) if unit == "day" else timedelta(hours=1)), unit)
+
+def revenue_query(unit, since):
+    return {"granularity": unit, "bucket": {"$gte": since}}, {"_id": 0, "bucket": 1, "revenue": 1}
+
+def revenue_frame(rows):
+    return pd.DataFrame(list(rows), columns=['bucket', 'revenue']).rename(columns={'bucket': 'date', 'revenue': 'total_fare'})
+
+def point_cells(points, cell=MAP_CELL_DEGREES):
+    # Client-side grid_cells_pipeline over a map_points() frame, in the same {_id, count} shape.
+    counts = (points[['lat', 'lon']].astype('float64') // cell).astype('int64').value_counts()
+    return [{"_id": {"lat": lat, "lng": lng}, "count": int(n)} for (lat, lng), n in counts.items()]
+
+def cells_frame(cells, cell=MAP_CELL_DEGREES):
+    df = pd.DataFrame({'lat': [(c['_id']['lat'] + 0.5) * cell for c in cells], 'lon': [(c['_id']['lng'] + 0.5) * cell for c in cells], 'count': [c['count'] for c in cells]})
+    # Marker radius in metres, scaled so the busiest cell just fills its square.
+    df['size'] = (cell * 111_000 / 2) * (df['count'] / max(1, df['count'].max())) ** 0.5
+    return df
+
+
+class RideRepository:
+    # Reads for every page against one handle, usually page_db(db, page); writes take the primary db.
+    def __init__(self, db):
+        self.db = db
+
+    def dashboard_metrics(self):
+        if legacy_server(self.db):
+            return metrics_summary(legacy_dashboard_metrics(self.db))
+        return metrics_summary(next(self.db.rides.aggregate(dashboard_metrics_pipeline(), hint=METRICS_HINT), None))
+
+    def rides(self, columns=None, query=None, sort=RIDES_SORT):
+        return load_frame(self.db.rides, RIDES_SCHEMA, columns, query, sort, RIDES_DTYPES)
+
+    def rides_page(self, columns, statuses=None, after=None, page_size=RIDES_PAGE_SIZE, since=None):
+        # Returns (frame, cursor for the next page or None).
+        legacy = legacy_server(self.db)
+        rides = list(self.db.rides.find(keyset_query(statuses, after, since), ride_projection(page_fields(columns), legacy)).sort(RIDES_SORT).limit(page_size + 1))
+        return split_page([flatten(r) for r in rides] if legacy else rides, columns, page_size)
+
+    def count_rides(self, query):
+        return self.db.rides.count_documents(query)
+
+    def ride_statuses(self):
+        return sorted(self.db.rides.distinct("status"))
+
+    def map_cells(self, query, cell=MAP_CELL_DEGREES):
+        if legacy_server(self.db):
+            return cells_frame(point_cells(map_points(self.rides(PAGE_COLUMNS["map"], query)), cell), cell)
+        return cells_frame(list(self.db.rides.aggregate(grid_cells_pipeline(query, cell))), cell)
+
+    def revenue_trend(self, unit="day", since=None):
+        query, projection = revenue_query(unit, since or revenue_since(unit))
+        return revenue_frame(self.db.revenue_rollup.find(query, projection).sort("bucket", 1))
+
+    def trend(self, model):
+        return trend_fit(self.db.trend_stats.find_one({"_id": model}))
+
+    def drivers(self):
+        return load_frame(self.db.drivers, DRIVERS_SCHEMA, sort=[("driver_id", 1)], dtypes=DRIVERS_DTYPES)
+
+    def surge(self):
+        return load_frame(self.db.surge_pricing, SURGE_SCHEMA, sort=[("zone_id", 1)], dtypes=SURGE_DTYPES)
+
+    def riders(self):
+        return load_frame(self.db.riders, RIDERS_SCHEMA, sort=[("rider_id", 1)])
+
+
+# ---------- Async reads ----------
+# Same reads as RideRepository on an async database (connect_async(), or a motor database).
+# These assume MongoDB 4.4+; there is no async mongomock, so no legacy_server() paths.
+# There is no pymongoarrow async API, so frames always come from the NumPy column builder.
+async def _resolve(value):
+    # pymongo's async aggregate() is a coroutine; motor's returns the cursor directly.
+    return await value if inspect.isawaitable(value) else value
+
+async def load_frame_async(collection, schema, columns=None, query=None, sort=None, dtypes=None):
+    schema = {c: schema[c] for c in columns} if columns else schema
+    cursor = collection.find(query or {}, flat_projection(schema))
+    df = await columnar.frame_from_async_cursor(cursor.sort(sort) if sort else cursor, schema)
+    return columnar.compact(df, dtypes) if dtypes else df
+
+
+class AsyncRideRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def dashboard_metrics(self):
+        cursor = await _resolve(self.db.rides.aggregate(dashboard_metrics_pipeline(), hint=METRICS_HINT))
+        docs = await cursor.to_list(1)
+        return metrics_summary(docs[0] if docs else None)
+
+    async def rides(self, columns=None, query=None, sort=RIDES_SORT):
+        return await load_frame_async(self.db.rides, RIDES_SCHEMA, columns, query, sort, RIDES_DTYPES)
+
+    async def rides_page(self, columns, statuses=None, after=None, page_size=RIDES_PAGE_SIZE, since=None):
+        cursor = self.db.rides.find(keyset_query(statuses, after, since), ride_projection(page_fields(columns))).sort(RIDES_SORT).limit(page_size + 1)
+        return split_page(await cursor.to_list(page_size + 1), columns, page_size)
+
+    async def count_rides(self, query):
+        return await self.db.rides.count_documents(query)
+
+    async def ride_statuses(self):
+        return sorted(await self.db.rides.distinct("status"))
+
+    async def map_cells(self, query, cell=MAP_CELL_DEGREES):
+        cursor = await _resolve(self.db.rides.aggregate(grid_cells_pipeline(query, cell)))
+        return cells_frame(await cursor.to_list(None), cell)
+
+    async def revenue_trend(self, unit="day", since=None):
+        query, projection = revenue_query(unit, since or revenue_since(unit))
+        return revenue_frame(await self.db.revenue_rollup.find(query, projection).sort("bucket", 1).to_list(None))
+
+    async def trend(self, model):
+        return trend_fit(await self.db.trend_stats.find_one({"_id": model}))
+
+    async def drivers(self):
+        return await load_frame_async(self.db.drivers, DRIVERS_SCHEMA, sort=[("driver_id", 1)], dtypes=DRIVERS_DTYPES)
+
+    async def surge(self):
+        return await load_frame_async(self.db.surge_pricing, SURGE_SCHEMA, sort=[("zone_id", 1)], dtypes=SURGE_DTYPES)
+
+    async def riders(self):
+        return await load_frame_async(self.db.riders, RIDERS_SCHEMA, sort=[("rider_id", 1)])
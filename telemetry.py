@@ -0,0 +1,207 @@
+# telemetry.py — Prometheus text-format metrics for the dashboard process, served on a local port
+# Counters and histograms are recorded as things happen (loaders, cache lookups, reruns); gauges
+# describing current state (sessions, pool, DataFrame memory) are filled by collector callbacks
+# right before each scrape. With prometheus_client installed the registry is exposed through its
+# default registry, next to the process_* / python_* metrics; otherwise the same families are
+# rendered here. Either way one daemon http.server thread serves GET /metrics.
+#   curl -s localhost:9464/metrics
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import urlopen
+
+try:
+    import prometheus_client
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+except ImportError:  # optional: pip install prometheus-client
+    prometheus_client = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metric:
+    # One family: label values -> float, or for histograms [cumulative bucket counts..., count, sum].
+    def __init__(self, name, kind, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.kind, self.help, self.labelnames = name, kind, help, tuple(labels)
+        self.buckets = tuple(buckets) if kind == "histogram" else ()
+        self.values, self.lock = {}, threading.Lock()
+
+    def inc(self, *labels, amount=1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def set(self, value, *labels):
+        # Gauges, and counters mirrored from totals kept elsewhere (e.g. MongoMonitor).
+        with self.lock:
+            self.values[labels] = float(value)
+
+    def replace(self, values):
+        # Swaps in every labelled value at once, so label sets that went away stop being exported.
+        with self.lock:
+            self.values = {labels: float(v) for labels, v in values.items()}
+
+    def observe(self, value, *labels):
+        with self.lock:
+            row = self.values.setdefault(labels, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def get(self, *labels):
+        with self.lock:
+            value = self.values.get(labels)
+            return list(value) if isinstance(value, list) else value
+
+    def snapshot(self):
+        with self.lock:
+            return {labels: list(v) if isinstance(v, list) else v for labels, v in self.values.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics, self.collectors, self.lock = {}, {}, threading.Lock()
+
+    def _metric(self, name, kind, help, labels=(), **kwargs):
+        # Get-or-create: app.py re-executes on every rerun and re-declares its metrics.
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(name, kind, help, labels, **kwargs)
+            elif (metric.kind, metric.labelnames) != (kind, tuple(labels)):
+                raise ValueError(f"metric {name} already registered as {metric.kind}{metric.labelnames}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._metric(name, "counter", help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._metric(name, "gauge", help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._metric(name, "histogram", help, labels, buckets=buckets)
+
+    def collector(self, name, fn):
+        # fn() runs before every scrape; registering the same name again replaces it.
+        with self.lock:
+            self.collectors[name] = fn
+
+    def collect(self):
+        with self.lock:
+            collectors, metrics = list(self.collectors.values()), list(self.metrics.values())
+        for fn in collectors:
+            try:
+                fn()
+            except Exception:
+                pass  # a failing collector leaves its gauges at their last values
+        return metrics
+
+    def render(self):
+        return "".join(_render(metric) for metric in self.collect())
+
+REGISTRY = Registry()
+
+
+# ---------- Text format ----------
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}" if pairs else ""
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+def _render(metric):
+    lines = [f"# HELP {metric.name} {_escape(metric.help)}", f"# TYPE {metric.name} {metric.kind}"]
+    for labels, value in sorted(metric.snapshot().items()):
+        if metric.kind != "histogram":
+            lines.append(f"{metric.name}{_labels(metric.labelnames, labels)} {_number(value)}")
+            continue
+        for bound, count in zip(metric.buckets + (float("inf"),), value[:-2] + [value[-2]]):
+            lines.append(f"{metric.name}_bucket{_labels(metric.labelnames, labels, [('le', _number(bound))])} {count}")
+        lines.append(f"{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(value[-1])}")
+        lines.append(f"{metric.name}_count{_labels(metric.labelnames, labels)} {value[-2]}")
+    return "\n".join(lines) + "\n"
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+def parse(text):
+    # {(sample name, frozenset of label pairs): value} — enough to assert on a scrape.
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match and not line.startswith("#"):
+            labels = frozenset((k, v.replace(r'\"', '"').replace(r"\n", "\n").replace(r"\\", "\\")) for k, v in LABEL.findall(match.group(2) or ""))
+            samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+def scrape(url, timeout=5):
+    with urlopen(url, timeout=timeout) as response:
+        return parse(response.read().decode())
+
+
+# ---------- prometheus_client bridge ----------
+class _Bridge:
+    # Exposes a Registry as prometheus_client metric families.
+    def __init__(self, registry):
+        self.registry = registry
+
+    def collect(self):
+        for metric in self.registry.collect():
+            labelnames, values = list(metric.labelnames), metric.snapshot()
+            if metric.kind == "histogram":
+                family = HistogramMetricFamily(metric.name, metric.help, labels=labelnames)
+                for labels, row in values.items():
+                    buckets = [(_number(b), c) for b, c in zip(metric.buckets, row)] + [("+Inf", row[-2])]
+                    family.add_metric(list(labels), buckets, row[-1])
+            else:
+                family = (CounterMetricFamily if metric.kind == "counter" else GaugeMetricFamily)(metric.name, metric.help, labels=labelnames)
+                for labels, value in values.items():
+                    family.add_metric(list(labels), value)
+            yield family
+
+_bridged, _bridge_lock = set(), threading.Lock()
+
+def exposition(registry=REGISTRY):
+    # (body bytes, content type) for one scrape.
+    if prometheus_client is None:
+        return registry.render().encode(), CONTENT_TYPE
+    with _bridge_lock:  # not registry.lock: register() collects once to learn the names
+        if id(registry) not in _bridged:
+            prometheus_client.REGISTRY.register(_Bridge(registry))
+            _bridged.add(id(registry))
+    return prometheus_client.generate_latest(prometheus_client.REGISTRY), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# ---------- HTTP exporter ----------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        try:
+            body, content_type = exposition(self.server.registry)
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds would flood the app's log
+
+def serve(port, addr="127.0.0.1", registry=REGISTRY):
+    # Starts the exporter on a daemon thread and returns the server (port 0 picks a free port:
+    # server.server_address[1]); server.shutdown() stops it.
+    server = ThreadingHTTPServer((addr, int(port)), _Handler)
+    server.daemon_threads, server.registry = True, registry
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    return server